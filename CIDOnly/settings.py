@@ -39,17 +39,21 @@ INSTALLED_APPS = [
     'rest_framework',
     'drf_spectacular',
     'base',
-    'token_blacklist'
+    'token_blacklist',
+    'jobs',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'base.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'demo.middleware.RequestContextMiddleware',
+    'demo.middleware.ProfilingMiddleware',
 ]
 
 DATABASES = {
@@ -65,6 +69,20 @@ DATABASES = {
             'charset': 'utf8mb4'},
     }}
 
+# 只读副本：DJANGO_MYSQL_REPLICA_HOSTS="host1,host2:3307"，其余连接参数与主库相同
+DATABASE_REPLICAS = []
+for _index, _address in enumerate(filter(None, os.environ.get('DJANGO_MYSQL_REPLICA_HOSTS', '').split(',')), 1):
+    _host, _, _port = _address.strip().partition(':')
+    DATABASES['replica%d' % _index] = dict(
+        DATABASES['default'],
+        HOST=_host,
+        PORT=int(_port or DATABASES['default']['PORT']),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append('replica%d' % _index)
+DATABASE_ROUTERS = ['base.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+
 ROOT_URLCONF = 'CIDOnly.urls'
 
 TEMPLATES = [
@@ -139,7 +157,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         # 'demo.authentication.JWTStatelessUserAuthentication',
         'demo.authentication.JWTAuthentication',
-    )
+    ),
+    # JSON 使用 demo.codec (有 orjson 时使用 orjson)
+    'DEFAULT_RENDERER_CLASSES': [
+        'demo.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'demo.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
@@ -150,5 +178,39 @@ SPECTACULAR_SETTINGS = {
     # OTHER SETTINGS
 }
 
+# demo 应用日志：后台线程写出，队列满时丢弃，按分类采样
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'demo_queue': {
+            '()': 'demo.log.make_queue_handler',
+            'maxsize': 10000,
+            'rates': {
+                # 每个请求一行访问日志，默认只抽样 1%；DJANGO_REQUEST_LOG_RATE=1 记录全部
+                'demo.request': float(os.environ.get('DJANGO_REQUEST_LOG_RATE') or 0.01),
+                'demo.permissions': 0.01,
+                'demo.views': 1.0,
+            },
+        },
+    },
+    'loggers': {
+        'demo': {
+            'handlers': ['demo_queue'],
+            'level': 'DEBUG' if DEBUG else 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# GitHub webhook 签名密钥和本地事件队列
+WEBHOOK_SECRET = os.environ.get('DJANGO_WEBHOOK_SECRET') or ''
+WEBHOOK_QUEUE_PATH = os.environ.get('DJANGO_WEBHOOK_QUEUE_PATH') or BASE_DIR / 'webhooks.sqlite3'
+
+# 按需性能分析：结果目录、保留份数和随机抽样比例(0 表示只在员工请求时分析)
+PROFILE_DIR = os.environ.get('DJANGO_PROFILE_DIR') or BASE_DIR / 'profiles'
+PROFILE_MAX_FILES = 50
+PROFILE_SAMPLE_RATE = float(os.environ.get('DJANGO_PROFILE_SAMPLE_RATE') or 0)
+
 LOGIN_URL = '/admin/login/'
 # LOGIN_URL = '/demo/login/'
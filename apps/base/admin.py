@@ -1,3 +1,169 @@
-from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-# Register your models here.
+CURSOR_VAR = 'cursor'
+# 上一页：取主键排在该游标之前的一页
+BEFORE_VAR = 'before'
+
+
+def estimated_row_count(model, using='default'):
+    """
+    从数据库统计信息中读取表的估算行数，不支持的数据库返回 None。
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    未过滤的大表使用统计信息中的估算行数；小表或过滤后的结果使用精确计数，但最多数到 count_limit。
+    """
+    exact_count_threshold = 10000
+    count_limit = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_count_threshold:
+                return estimate
+        return queryset.order_by()[:self.count_limit].count()
+
+
+class KeysetChangeList(ChangeList):
+    """
+    按主键排序时使用 "WHERE pk < 游标" 翻页，代替深度 OFFSET；上一页反向查询后再倒序。
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = self.get_cursor(request, CURSOR_VAR)
+        self.before = self.get_cursor(request, BEFORE_VAR)
+        self.keyset = False
+        self.next_cursor = None
+        self.prev_cursor = None
+        super().__init__(request, *args, **kwargs)
+        self.params.pop(CURSOR_VAR, None)
+        self.params.pop(BEFORE_VAR, None)
+
+    @staticmethod
+    def get_cursor(request, name):
+        try:
+            return int(request.GET[name])
+        except (KeyError, ValueError):
+            return None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_keyset_direction(self):
+        pk_name = self.model._meta.pk.name
+        ordering = {str(field).replace(pk_name, 'pk') for field in self.queryset.query.order_by}
+        if ordering == {'-pk'}:
+            return 'lt'
+        if ordering == {'pk'}:
+            return 'gt'
+        return None
+
+    def get_results(self, request):
+        direction = self.get_keyset_direction()
+        if direction is None:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        if self.before is not None:
+            opposite = 'gt' if direction == 'lt' else 'lt'
+            queryset = self.queryset.filter(**{'pk__%s' % opposite: self.before}).reverse()
+            results = list(queryset[:self.list_per_page + 1])
+            more_before = len(results) > self.list_per_page
+            results = results[:self.list_per_page][::-1]
+            if results:
+                self.next_cursor = results[-1].pk
+                if more_before:
+                    self.prev_cursor = results[0].pk
+        else:
+            queryset = self.queryset
+            if self.cursor is not None:
+                queryset = queryset.filter(**{'pk__%s' % direction: self.cursor})
+            results = list(queryset[:self.list_per_page + 1])
+            if len(results) > self.list_per_page:
+                results = results[:self.list_per_page]
+                self.next_cursor = results[-1].pk
+            if self.cursor is not None and results:
+                self.prev_cursor = results[0].pk
+
+        self.keyset = True
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = results
+        self.can_show_all = False
+        self.multi_page = self.prev_cursor is not None or self.next_cursor is not None
+        self.paginator = paginator
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR, BEFORE_VAR])
+
+    @property
+    def prev_page_url(self):
+        return self.get_query_string({BEFORE_VAR: self.prev_cursor}, remove=[CURSOR_VAR])
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, remove=[BEFORE_VAR])
+
+
+class LargeTableAdminMixin:
+    """
+    大表的 ModelAdmin：估算总数、按主键键集翻页、按主键排序，搜索只做走索引的精确匹配。
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+    ordering = ('-pk',)
+    sortable_by = ()
+    # 精确匹配的字段，整数字段只在搜索词是数字时参与
+    exact_search_fields = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_fields(self, request):
+        return self.search_fields or self.exact_search_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term or not self.exact_search_fields:
+            return super().get_search_results(request, queryset, search_term)
+
+        condition = Q()
+        for name in self.exact_search_fields:
+            field = self.model._meta.get_field(name)
+            if field.get_internal_type() in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField',
+                                             'ForeignKey') and not search_term.isdigit():
+                continue
+            condition |= Q(**{field.attname: search_term})
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), False
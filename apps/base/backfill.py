@@ -0,0 +1,197 @@
+"""
+在线回填：大表改列类型时不使用会锁表的 AlterField，而是
+
+1. 迁移中新增可空的新列(瞬时完成)；
+2. 用 onlinemigrate 命令按主键分块、限速地把旧列转换写入新列，进度保存在 BackfillCheckpoint 中；
+3. 回填完成后，由带 RequireBackfill 检查的迁移只在 state 中把模型字段切换到新列读写。
+
+各应用在自己的 backfills.py 中调用 register() 声明回填任务。
+"""
+import time
+
+from django.apps import apps as global_apps
+from django.db import connections, migrations, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import autodiscover_modules
+
+REGISTRY = {}
+
+
+def parse_legacy_datetime(value):
+    """
+    把历史字符串时间转换为带时区的 datetime，无法解析时返回 None。
+    """
+    if not value:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    try:
+        parsed = parse_datetime(value.strip())
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def _truncate(value):
+    # 旧列只精确到秒，比较时忽略微秒
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value.replace(microsecond=0)
+
+
+class ColumnBackfill:
+    """
+    一个回填任务: model 为 "app_label.ModelName"，columns 为 (旧列, 新列, 转换函数) 列表。
+    只按列名操作，与模型当前指向哪一列无关。
+    """
+
+    def __init__(self, name, model, columns):
+        self.name = name
+        self.model = model
+        self.columns = tuple(columns)
+
+    def get_model(self, apps=None):
+        return (apps or global_apps).get_model(self.model)
+
+    def is_empty(self, connection, table):
+        # 判断是否存在需要回填但尚未回填的行；只用于检查迁移，允许一次全表扫描
+        qn = connection.ops.quote_name
+        condition = " OR ".join(
+            "({source} IS NOT NULL AND {source} <> '' AND {target} IS NULL)".format(
+                source=qn(source), target=qn(target)
+            )
+            for source, target, _ in self.columns
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM {} WHERE {} LIMIT 1".format(qn(table), condition))
+            return cursor.fetchone() is None
+
+    def run(self, using="default", chunk_size=1000, sleep=0.05, restart=False, verify=False, log=None):
+        """
+        按主键分块回填，每块一个短事务，块之间休眠 sleep 秒以限制对线上的影响。
+        verify 为真时重新比较所有行，只更新与旧列不一致的行，用于切换前后的追平。
+        """
+        from .models import BackfillCheckpoint
+
+        model = self.get_model()
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        pk = qn(model._meta.pk.column)
+
+        checkpoint, _created = BackfillCheckpoint.objects.using(using).get_or_create(name=self.name)
+        if restart or verify:
+            checkpoint.last_pk = 0
+            checkpoint.completed_at = None
+            checkpoint.save(using=using)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT MAX({}) FROM {}".format(pk, table))
+            max_pk = cursor.fetchone()[0] or 0
+
+        select_sql = "SELECT {pk}, {columns} FROM {table} WHERE {pk} > %s AND {pk} <= %s".format(
+            pk=pk,
+            table=table,
+            columns=", ".join("%s, %s" % (qn(source), qn(target)) for source, target, _ in self.columns),
+        )
+        # 读出和写回之间线上代码可能已经双写了这一行，更新必须带条件，不能用读出时的旧值覆盖：
+        # 普通模式只填充仍为空的新列；verify 模式只在旧列仍等于读出的值时覆盖新列
+        if verify:
+            update_sql = "UPDATE {table} SET {assignments} WHERE {pk} = %s AND {unchanged}".format(
+                table=table,
+                pk=pk,
+                assignments=", ".join("%s = %%s" % qn(target) for _, target, _ in self.columns),
+                unchanged=" AND ".join(
+                    "({source} = %s OR ({source} IS NULL AND %s IS NULL))".format(source=qn(source))
+                    for source, _, _ in self.columns
+                ),
+            )
+        else:
+            update_sql = "UPDATE {table} SET {assignments} WHERE {pk} = %s".format(
+                table=table,
+                pk=pk,
+                assignments=", ".join(
+                    "{target} = COALESCE({target}, %s)".format(target=qn(target)) for _, target, _ in self.columns
+                ),
+            )
+
+        updated = 0
+        last_pk = checkpoint.last_pk
+        while last_pk < max_pk:
+            upper = min(last_pk + chunk_size, max_pk)
+            with transaction.atomic(using=using):
+                with connection.cursor() as cursor:
+                    cursor.execute(select_sql, [last_pk, upper])
+                    params = []
+                    for row in cursor.fetchall():
+                        values, sources, changed = [], [], False
+                        for index, (_, _, convert) in enumerate(self.columns):
+                            source, target = row[1 + index * 2], row[2 + index * 2]
+                            value = convert(source)
+                            if verify:
+                                changed = changed or _truncate(value) != _truncate(parse_legacy_datetime(target))
+                            elif target is None and value is not None:
+                                changed = True
+                            values.append(connection.ops.adapt_datetimefield_value(value))
+                            sources.extend((source, source))
+                        if changed:
+                            params.append(values + [row[0]] + (sources if verify else []))
+                    if params:
+                        cursor.executemany(update_sql, params)
+                        # verify 模式下因并发写入而跳过的行不计入
+                        updated += cursor.rowcount
+                checkpoint.last_pk = upper
+                checkpoint.save(using=using, update_fields=["last_pk", "updated_at"])
+            last_pk = upper
+            if log is not None:
+                log("%s: %d/%d, %d rows updated" % (self.name, last_pk, max_pk, updated))
+            if sleep:
+                time.sleep(sleep)
+
+        checkpoint.completed_at = timezone.now()
+        checkpoint.save(using=using, update_fields=["completed_at", "updated_at"])
+        return updated
+
+
+def register(name, model, columns):
+    REGISTRY[name] = ColumnBackfill(name, model, columns)
+    return REGISTRY[name]
+
+
+def registered():
+    autodiscover_modules("backfills")
+    return REGISTRY
+
+
+def get_backfill(name):
+    return registered()[name]
+
+
+class RequireBackfill(migrations.RunPython):
+    """
+    切换读写到新列之前的检查：回填已完成，或者表中没有待回填的行(例如新建的数据库)。
+    """
+
+    def __init__(self, name, model, columns):
+        self.backfill = ColumnBackfill(name, model, columns)
+        super().__init__(self.check, migrations.RunPython.noop, elidable=True)
+
+    def check(self, apps, schema_editor):
+        connection = schema_editor.connection
+        if not router.allow_migrate(connection.alias, self.backfill.model.split(".")[0]):
+            return
+        model = self.backfill.get_model(apps)
+        checkpoint_model = apps.get_model("base", "BackfillCheckpoint")
+        done = checkpoint_model.objects.using(connection.alias).filter(
+            name=self.backfill.name, completed_at__isnull=False
+        ).exists()
+        if not done and not self.backfill.is_empty(connection, model._meta.db_table):
+            raise RuntimeError(
+                "Backfill '%s' has not completed. Run 'manage.py onlinemigrate %s' "
+                "before applying this migration." % (self.backfill.name, self.backfill.name)
+            )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...backfill import get_backfill, registered
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfills new columns from legacy columns in primary-key chunks with throttling and "
+        "checkpointing. Run it after the migration that adds the new columns and before the one "
+        "that switches reads over; run it again with --verify after deploying to catch rows "
+        "written by the previous release."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", help="Backfill name, omit to list registered backfills")
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between chunks")
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Re-check every row and fix those whose new column differs from the legacy one",
+        )
+
+    def handle(self, *args, **kwargs):
+        name = kwargs["name"]
+        try:
+            backfill = get_backfill(name) if name else None
+        except KeyError:
+            raise CommandError("Unknown backfill '%s'" % name)
+        if backfill is None:
+            for registered_name in sorted(registered()):
+                self.stdout.write(registered_name)
+            return
+
+        updated = backfill.run(
+            using=kwargs["database"],
+            chunk_size=kwargs["chunk_size"],
+            sleep=kwargs["sleep"],
+            restart=kwargs["restart"],
+            verify=kwargs["verify"],
+            log=self.stdout.write if kwargs["verbosity"] > 1 else None,
+        )
+        self.stdout.write("%s: %d rows updated" % (name, updated))
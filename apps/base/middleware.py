@@ -0,0 +1,49 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.utils import InterfaceError, OperationalError
+
+from .routers import (
+    DATABASE_REPLICAS, REPLICA_STICKY_SECONDS, _read_replica, _use_replicas, _wrote_primary, mark_recent_write,
+    replica_health,
+)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'primary_pin'
+
+
+class ReplicaMiddleware:
+    """
+    安全方法的请求允许读副本。请求写过主库后，通过 cookie 和按用户的缓存标记，
+    让接下来 REPLICA_STICKY_SECONDS 秒内该客户端/用户的请求都读主库。
+    读副本时出现连接错误的请求剔除该副本，改读主库重新执行一次视图。
+    """
+
+    def __init__(self, get_response):
+        if not DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replicas = request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES
+        tokens = (_use_replicas.set(use_replicas), _wrote_primary.set(False), _read_replica.set(None))
+        try:
+            response = self.get_response(request)
+            if _wrote_primary.get():
+                response.set_cookie(STICKY_COOKIE, '1', max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+                user = getattr(request, 'user', None)
+                if user is not None and user.is_authenticated:
+                    mark_recent_write(user.pk)
+            return response
+        finally:
+            _use_replicas.reset(tokens[0])
+            _wrote_primary.reset(tokens[1])
+            _read_replica.reset(tokens[2])
+
+    def process_exception(self, request, exception):
+        alias = _read_replica.get()
+        if alias is None or _wrote_primary.get() or not isinstance(exception, (OperationalError, InterfaceError)):
+            return None
+        replica_health.eject(alias)
+        _use_replicas.set(False)
+        _read_replica.set(None)
+        match = request.resolver_match
+        return match.func(request, *match.args, **match.kwargs)
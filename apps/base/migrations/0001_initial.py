@@ -0,0 +1,24 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='回填任务名', max_length=100, unique=True)),
+                ('last_pk', models.BigIntegerField(default=0, help_text='已处理到的主键')),
+                ('completed_at', models.DateTimeField(help_text='完成时间', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
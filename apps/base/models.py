@@ -1,14 +1,74 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def deleted(self):
+        return self.filter(deleted_at__isnull=False)
+
+    def soft_delete(self, user=None):
+        """
+        用一条 UPDATE 软删除查询集中尚未删除的记录，返回受影响的行数。
+        """
+        return self.alive().update(**self.model.soft_delete_values(timezone.now(), user))
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    pass
 
 
 class ReviewBaseModels(models.Model):
     """
     需要进行权限验证和审查的基类
     """
-    created_at = models.CharField(max_length=20, null=True)
-    created_by = models.ForeignKey('User', models.PROTECT, related_name='created', null=True)
-    deleted_at = models.CharField(max_length=20, null=True)
-    deleted_by = models.ForeignKey('User', models.PROTECT, related_name='deleted', null=True)
+    created_at = models.DateTimeField(null=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, models.PROTECT, related_name='%(app_label)s_%(class)s_created', null=True
+    )
+    deleted_at = models.DateTimeField(null=True)
+    deleted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, models.PROTECT, related_name='%(app_label)s_%(class)s_deleted', null=True
+    )
+
+    objects = SoftDeleteManager()
 
     class Meta:
         abstract = True
+        indexes = [
+            # 未删除记录按主键分页: WHERE deleted_at IS NULL ORDER BY id
+            models.Index(fields=['deleted_at', 'id'], name='%(app_label)s_%(class)s_alive'),
+            models.Index(fields=['created_at'], name='%(app_label)s_%(class)s_created'),
+        ]
+
+    @property
+    def is_deleted(self):
+        return self.deleted_at is not None
+
+    @classmethod
+    def soft_delete_values(cls, now, user=None):
+        """
+        软删除时写入的字段，子类可以追加需要同步的字段。
+        """
+        return {'deleted_at': now, 'deleted_by': user}
+
+    def soft_delete(self, user=None):
+        values = self.soft_delete_values(timezone.now(), user)
+        for name, value in values.items():
+            setattr(self, name, value)
+        self.save(update_fields=list(values))
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    在线回填的进度
+    """
+    name = models.CharField(max_length=100, unique=True, help_text='回填任务名')
+    last_pk = models.BigIntegerField(default=0, help_text='已处理到的主键')
+    completed_at = models.DateTimeField(null=True, help_text='完成时间')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '{} ({})'.format(self.name, self.last_pk)
@@ -0,0 +1,192 @@
+"""
+读写分离：主库 default 负责所有写入，DATABASE_REPLICAS 中的只读副本承担请求中的读。
+
+只有 ReplicaMiddleware 放行的请求(安全方法，且不在写入后的粘滞窗口内)才会读副本；事务内、
+本请求已经写过主库、副本不健康时都回到主库。管理命令和后台任务不经过中间件，始终使用主库。
+"""
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import InterfaceError, OperationalError
+
+DATABASE_REPLICAS = tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+# 用户写入后，这段时间内的请求都读主库
+REPLICA_STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+# 粘滞标记所在的缓存，多进程部署应使用共享缓存
+REPLICA_STICKY_CACHE = getattr(settings, 'REPLICA_STICKY_CACHE', 'default')
+REPLICA_CHECK_INTERVAL = getattr(settings, 'REPLICA_CHECK_INTERVAL', 5)
+REPLICA_EJECT_SECONDS = getattr(settings, 'REPLICA_EJECT_SECONDS', 30)
+# 允许的最大复制延迟(秒)，None 表示不检查(检查需要 REPLICATION CLIENT 权限)
+REPLICA_MAX_LAG = getattr(settings, 'REPLICA_MAX_LAG', None)
+
+_use_replicas = ContextVar('use_replicas', default=False)
+_wrote_primary = ContextVar('wrote_primary', default=False)
+# 本请求读过的副本，查询失败时据此剔除并改读主库
+_read_replica = ContextVar('read_replica', default=None)
+
+
+def replica_lag(connection):
+    """
+    返回副本的复制延迟(秒)，复制已停止时返回 None；非 MySQL 数据库只检查连接可用。
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor != 'mysql' or REPLICA_MAX_LAG is None:
+            cursor.execute('SELECT 1')
+            return 0
+        cursor.execute('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+        if row is None:
+            return 0
+        status = dict(zip([column[0] for column in cursor.description], row))
+        lag = status.get('Seconds_Behind_Master', status.get('Seconds_Behind_Source'))
+        return None if lag is None else int(lag)
+
+
+class ReplicaHealth:
+    """
+    每个进程各自记录副本健康状态：后台线程每 REPLICA_CHECK_INTERVAL 秒探测连接和复制延迟，
+    查询出现连接错误时立即剔除一段时间。请求线程只读取结果，不做探测。
+    """
+
+    def __init__(self, aliases):
+        self.aliases = aliases
+        self.ejected_until = {}
+        self.lock = threading.Lock()
+        self._prober_pid = None
+
+    def eject(self, alias, seconds=REPLICA_EJECT_SECONDS):
+        self.ejected_until[alias] = time.monotonic() + seconds
+
+    def is_healthy(self, alias):
+        return self.ejected_until.get(alias, 0) <= time.monotonic()
+
+    def probe(self, alias):
+        connection = connections[alias]
+        try:
+            lag = replica_lag(connection)
+        except (OperationalError, InterfaceError):
+            lag = None
+        try:
+            # 探测线程不长期占用副本连接
+            connection.close()
+        except (OperationalError, InterfaceError):
+            pass
+        return lag is not None and (REPLICA_MAX_LAG is None or lag <= REPLICA_MAX_LAG)
+
+    def check(self):
+        for alias in self.aliases:
+            if not self.probe(alias):
+                self.eject(alias)
+
+    def run(self):
+        while True:
+            self.check()
+            time.sleep(REPLICA_CHECK_INTERVAL)
+
+    def start(self):
+        """
+        在当前进程中启动探测线程；fork 出的子进程不继承线程，第一次使用时重新启动。
+        """
+        pid = os.getpid()
+        if self._prober_pid == pid:
+            return
+        with self.lock:
+            if self._prober_pid != pid:
+                threading.Thread(target=self.run, name='replica-health', daemon=True).start()
+                self._prober_pid = pid
+
+    def healthy(self):
+        self.start()
+        return [alias for alias in self.aliases if self.is_healthy(alias)]
+
+
+replica_health = ReplicaHealth(DATABASE_REPLICAS)
+
+
+class EjectOnError:
+    """
+    副本连接上的查询出现连接错误时剔除该副本。
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        try:
+            return execute(sql, params, many, context)
+        except (OperationalError, InterfaceError):
+            replica_health.eject(self.alias)
+            raise
+
+
+def install_eject_on_error(sender, connection, **kwargs):
+    if connection.alias in DATABASE_REPLICAS and not any(
+        isinstance(wrapper, EjectOnError) for wrapper in connection.execute_wrappers
+    ):
+        connection.execute_wrappers.append(EjectOnError(connection.alias))
+
+
+connection_created.connect(install_eject_on_error)
+
+
+def sticky_cache_key(user_id):
+    return 'replica:sticky:%s' % user_id
+
+
+def mark_recent_write(user_id):
+    caches[REPLICA_STICKY_CACHE].set(sticky_cache_key(user_id), 1, REPLICA_STICKY_SECONDS)
+
+
+def stick_to_primary(user_id=None):
+    """
+    当前请求改为读主库；指定 user_id 时，只有该用户处于写入后的粘滞窗口内才切换。
+    """
+    if not _use_replicas.get():
+        return False
+    if user_id is not None and caches[REPLICA_STICKY_CACHE].get(sticky_cache_key(user_id)) is None:
+        return False
+    _use_replicas.set(False)
+    return True
+
+
+class ReplicaRouter:
+    """
+    读请求分配到健康的副本，写入及其它情况使用主库；副本只是主库的镜像，不执行迁移。
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replicas.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        healthy = replica_health.healthy()
+        if not healthy:
+            return None
+        alias = random.choice(healthy)
+        _read_replica.set(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # 本请求之后的读都走主库，保证读到自己的写入
+        _wrote_primary.set(True)
+        _use_replicas.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in DATABASE_REPLICAS:
+            return False
+        return None
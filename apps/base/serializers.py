@@ -0,0 +1,110 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_list(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer 的稀疏字段和关系展开。
+
+    读请求带 ?fields=a,b 时只输出这些字段，?expand=x 把 Meta.expandable_fields 中的关系换成嵌套表示；
+    narrow_queryset() 按剩下的字段收窄查询的列(.only())、select_related 和 prefetch_related。
+    只作用于最外层的序列化器，嵌套序列化器保持完整字段。
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not self.is_root():
+            return fields
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        requested = parse_field_list(request, FIELDS_PARAM)
+        expand = parse_field_list(request, EXPAND_PARAM) or []
+        errors = {}
+        for param, names, known in ((FIELDS_PARAM, requested or (), fields), (EXPAND_PARAM, expand, expandable)):
+            unknown = [name for name in names if name not in known]
+            if unknown:
+                errors[param] = 'Unknown field(s): %s' % ', '.join(unknown)
+        if requested == []:
+            # ?fields= 为空时不输出空对象
+            errors[FIELDS_PARAM] = 'At least one field is required'
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        if requested is not None:
+            # 展开的关系即使没有列在 fields 中也输出
+            keep = set(requested) | set(expand)
+            fields = {name: field for name, field in fields.items() if name in keep}
+        for name in expand:
+            serializer_class, kwargs = expandable[name]
+            fields[name] = serializer_class(read_only=True, **kwargs)
+        return fields
+
+    def is_root(self):
+        parent = self.parent
+        return parent is None or (parent is self.root and isinstance(parent, serializers.ListSerializer))
+
+    def narrow_queryset(self, queryset, required_columns=()):
+        """
+        只加载输出字段需要的列和关系，required_columns 是视图自己要用的列；
+        遇到无法对应到模型字段的输出字段时不收窄列。
+        """
+        model = queryset.model
+        columns = {model._meta.pk.name, *required_columns}
+        select, prefetch = [], []
+        narrow = True
+        for field in self.fields.values():
+            if isinstance(field, serializers.HyperlinkedIdentityField):
+                columns.add(field.lookup_field if field.lookup_field != 'pk' else model._meta.pk.name)
+                continue
+            if field.source == '*' or len(field.source_attrs) != 1:
+                narrow = False
+                continue
+            source = field.source
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                narrow = False
+                continue
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if model_field.many_to_many or model_field.one_to_many:
+                related = model_field.related_model.objects.all()
+                if isinstance(nested, SerializerColumnsMixin):
+                    related = related.only(*nested.model_columns())
+                prefetch.append(Prefetch(source, queryset=related))
+            elif isinstance(nested, serializers.BaseSerializer):
+                select.append(source)
+                columns.add(source)
+                if isinstance(nested, SerializerColumnsMixin):
+                    columns.update('%s__%s' % (source, column) for column in nested.model_columns())
+            else:
+                # 普通字段；未展开的外键只需要本表的 <name>_id 列
+                columns.add(source)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if narrow:
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+class SerializerColumnsMixin:
+    """
+    用于展开的嵌套序列化器：字段都直接对应模型列，外层据此收窄关联查询的列。
+    """
+
+    def model_columns(self):
+        return [field.source for field in self.fields.values()]
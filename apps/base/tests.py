@@ -1,3 +1,293 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.utils import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import ResolverMatch
+from django.utils import timezone as django_timezone
+
+from demo.authentication import JWTAuthentication
+from demo.models import TOKEN_GENERATION_CACHE, User, token_generation_cache_key
+from demo.tokens import AccessToken
+from token_blacklist.models import OutstandingToken
+
+from . import admin as base_admin, middleware, routers
+from .admin import EstimatedCountPaginator
+from .backfill import ColumnBackfill, parse_legacy_datetime
+from .models import BackfillCheckpoint
+from .routers import (
+    REPLICA_STICKY_CACHE, ReplicaHealth, ReplicaRouter, _read_replica, _use_replicas, mark_recent_write,
+    sticky_cache_key,
+)
+
+
+class ReplicaHealthTests(SimpleTestCase):
+    def setUp(self):
+        self.health = ReplicaHealth(('replica1', 'replica2'))
+
+    def test_healthy_does_not_probe(self):
+        with mock.patch.object(self.health, 'start'), mock.patch.object(self.health, 'probe') as probe:
+            self.assertEqual(self.health.healthy(), ['replica1', 'replica2'])
+            self.health.eject('replica1')
+            self.assertEqual(self.health.healthy(), ['replica2'])
+        probe.assert_not_called()
+
+    def test_check_ejects_failed_replicas(self):
+        with mock.patch.object(self.health, 'probe', side_effect=lambda alias: alias == 'replica2'):
+            self.health.check()
+        self.assertFalse(self.health.is_healthy('replica1'))
+        self.assertTrue(self.health.is_healthy('replica2'))
+
+
+class ReplicaFallbackTests(SimpleTestCase):
+    def setUp(self):
+        self.health = ReplicaHealth(('replica1',))
+        mock.patch.object(middleware, 'replica_health', self.health).start()
+        mock.patch.object(middleware, 'DATABASE_REPLICAS', ('replica1',)).start()
+        self.addCleanup(mock.patch.stopall)
+        self.calls = []
+
+    def view(self, request):
+        self.calls.append(_use_replicas.get())
+        if _use_replicas.get():
+            _read_replica.set('replica1')
+            raise OperationalError('replica went away')
+        return HttpResponse('ok')
+
+    def get_response(self, request):
+        # 与 Django 的处理器一样，视图异常交给 process_exception
+        try:
+            return self.view(request)
+        except Exception as e:
+            response = self.replica_middleware.process_exception(request, e)
+            if response is None:
+                raise
+            return response
+
+    def test_replica_error_retries_on_primary(self):
+        self.replica_middleware = middleware.ReplicaMiddleware(self.get_response)
+        request = RequestFactory().get('/')
+        request.resolver_match = ResolverMatch(self.view, (), {})
+        response = self.replica_middleware(request)
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.calls, [True, False])
+        self.assertFalse(self.health.is_healthy('replica1'))
+
+    def test_primary_error_is_not_retried(self):
+        self.replica_middleware = middleware.ReplicaMiddleware(self.get_response)
+        request = RequestFactory().post('/')
+        request.resolver_match = ResolverMatch(self.view, (), {})
+        with mock.patch.object(self, 'view', side_effect=OperationalError('primary went away')):
+            with self.assertRaises(OperationalError):
+                self.replica_middleware(request)
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    两个 SQLite 文件充当副本，其中的用户行停留在旧值，由读到的值判断查询落在哪个库。
+    TestCase 的事务会让路由始终选择主库，这里使用 TransactionTestCase。
+    """
+    replicas = ('replica1', 'replica2')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.user = User.objects.create_user(username='primary', password='x')
+        for alias in self.replicas:
+            connections.settings[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory.name, alias + '.sqlite3'),
+            }
+            self.addCleanup(self.remove_connection, alias)
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(User)
+            User.objects.using(alias).create(pk=self.user.pk, username=alias, password='x')
+
+        self.health = ReplicaHealth(self.replicas)
+        mock.patch.object(self.health, 'start').start()
+        mock.patch.object(routers, 'replica_health', self.health).start()
+        mock.patch.object(middleware, 'replica_health', self.health).start()
+        mock.patch.object(middleware, 'DATABASE_REPLICAS', self.replicas).start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(caches[REPLICA_STICKY_CACHE].delete, sticky_cache_key(self.user.pk))
+        # 其它测试可能留下同一主键的令牌代数
+        caches[TOKEN_GENERATION_CACHE].delete(token_generation_cache_key(self.user.pk))
+
+    @staticmethod
+    def remove_connection(alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def request(self, view, method='get'):
+        """
+        经过 ReplicaMiddleware 执行 view，返回 view 的结果。
+        """
+        result = []
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(self.user))
+        middleware.ReplicaMiddleware(lambda request: result.append(view(request)) or HttpResponse())(request)
+        return result[0]
+
+    def read_username(self, request=None):
+        return User.objects.get(pk=self.user.pk).username
+
+    def test_db_for_read_uses_healthy_replicas(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(User))
+        self.assertEqual(self.read_username(), 'primary')
+        self.assertIn(self.request(self.read_username), self.replicas)
+
+        self.health.eject('replica1')
+        self.assertEqual(self.request(self.read_username), 'replica2')
+        self.health.eject('replica2')
+        self.assertEqual(self.request(self.read_username), 'primary')
+
+    def test_unsafe_methods_and_transactions_read_primary(self):
+        self.assertEqual(self.request(self.read_username, method='post'), 'primary')
+
+        def read_in_transaction(request):
+            with transaction.atomic():
+                return self.read_username()
+        self.assertEqual(self.request(read_in_transaction), 'primary')
+
+    def test_db_for_write_switches_request_to_primary(self):
+        def write_then_read(request):
+            before = self.read_username()
+            self.assertEqual(ReplicaRouter().db_for_write(User), DEFAULT_DB_ALIAS)
+            return before, self.read_username()
+        before, after = self.request(write_then_read)
+        self.assertIn(before, self.replicas)
+        self.assertEqual(after, 'primary')
+
+    def test_authentication_reads_primary_within_sticky_window(self):
+        def authenticate(request):
+            user, _ = JWTAuthentication().authenticate(request)
+            return user.username
+        self.assertIn(self.request(authenticate), self.replicas)
+
+        mark_recent_write(self.user.pk)
+        self.assertEqual(self.request(authenticate), 'primary')
+
+
+class ColumnBackfillTests(TestCase):
+    legacy = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    written = datetime(2021, 6, 7, 8, 9, 10, tzinfo=timezone.utc)
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username="backfill%d" % i, password="x") for i in range(5)]
+        # 模拟回填前的数据：只有旧字符串列有值
+        User.objects.filter(pk__in=self.pks()).update(created_at=None, legacy_created_at="2020-01-02 03:04:05")
+
+    def pks(self):
+        return [user.pk for user in self.users]
+
+    def backfill(self, convert=parse_legacy_datetime):
+        return ColumnBackfill("test.created_at", "demo.User", [("created_at", "created_at_dt", convert)])
+
+    def created_at(self):
+        return dict(User.objects.filter(pk__in=self.pks()).values_list("pk", "created_at"))
+
+    def test_run_resumes_from_checkpoint(self):
+        BackfillCheckpoint.objects.create(name="test.created_at", last_pk=self.users[1].pk)
+        self.backfill().run(chunk_size=2, sleep=0)
+        values = self.created_at()
+        self.assertEqual([values[pk] for pk in self.pks()], [None, None] + [self.legacy] * 3)
+        checkpoint = BackfillCheckpoint.objects.get(name="test.created_at")
+        self.assertIsNotNone(checkpoint.completed_at)
+
+        self.assertEqual(self.backfill().run(chunk_size=2, sleep=0, restart=True), 2)
+        self.assertEqual(set(self.created_at().values()), {self.legacy})
+
+    def dual_write_during(self, pk):
+        # 在读出这一块之后、写回之前，线上代码双写了同一行
+        def convert(value):
+            if not written:
+                written.append(pk)
+                User.objects.filter(pk=pk).update(created_at=self.written, legacy_created_at="2021-06-07 08:09:10")
+            return parse_legacy_datetime(value)
+
+        written = []
+        return convert
+
+    def test_concurrent_write_is_not_overwritten(self):
+        pk = self.users[0].pk
+        self.backfill(self.dual_write_during(pk)).run(chunk_size=100, sleep=0, restart=True)
+        values = self.created_at()
+        self.assertEqual(values.pop(pk), self.written)
+        self.assertEqual(set(values.values()), {self.legacy})
+
+    def test_verify_fixes_drift_but_not_concurrent_writes(self):
+        self.backfill().run(sleep=0, restart=True)
+        drifted, raced = self.pks()[:2]
+        User.objects.filter(pk__in=[drifted, raced]).update(created_at=self.written)
+
+        updated = self.backfill(self.dual_write_during(raced)).run(sleep=0, verify=True)
+        values = self.created_at()
+        self.assertEqual(updated, 1)
+        self.assertEqual(values[drifted], self.legacy)
+        self.assertEqual(values[raced], self.written)
+        self.assertEqual(User.objects.get(pk=raced).legacy_created_at, "2021-06-07 08:09:10")
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username="admin", password="x", email="a@example.com")
+        for i in range(6):
+            User.objects.create_user(username="page%d" % i, password="x")
+        self.client.force_login(self.admin_user)
+        mock.patch.object(admin.site._registry[User], "list_per_page", 3).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def page(self, query=""):
+        response = self.client.get("/admin/demo/user/" + query)
+        self.assertEqual(response.status_code, 200)
+        cl = response.context["cl"]
+        return cl, [user.pk for user in cl.result_list]
+
+    def test_keyset_next_and_previous(self):
+        pks = sorted(User.objects.values_list("pk", flat=True), reverse=True)
+        cl, first = self.page()
+        self.assertTrue(cl.keyset)
+        self.assertEqual(first, pks[:3])
+        self.assertIsNone(cl.prev_cursor)
+
+        cl, second = self.page(cl.next_page_url)
+        self.assertEqual(second, pks[3:6])
+        cl, third = self.page(cl.next_page_url)
+        self.assertEqual(third, pks[6:])
+        self.assertIsNone(cl.next_cursor)
+
+        cl, back = self.page(cl.prev_page_url)
+        self.assertEqual(back, second)
+        cl, back = self.page(cl.prev_page_url)
+        self.assertEqual(back, first)
+        self.assertIsNone(cl.prev_cursor)
+        self.assertEqual(cl.next_cursor, first[-1])
+
+    def test_small_table_uses_exact_count(self):
+        queryset = User.objects.order_by("-pk")
+        self.assertEqual(EstimatedCountPaginator(queryset, 3).count, 7)
+        with mock.patch.object(base_admin, "estimated_row_count", return_value=50) as estimate:
+            self.assertEqual(EstimatedCountPaginator(queryset, 3).count, 7)
+        estimate.assert_called_once()
+        with mock.patch.object(base_admin, "estimated_row_count", return_value=10 ** 6) as estimate:
+            self.assertEqual(EstimatedCountPaginator(queryset, 3).count, 10 ** 6)
+            # 过滤后的结果不使用估算值
+            self.assertEqual(EstimatedCountPaginator(queryset.filter(is_staff=True), 3).count, 1)
+        estimate.assert_called_once()
+
+    def test_jti_search_is_an_exact_lookup(self):
+        expires = django_timezone.now()
+        for jti in ("abc123", "abc1234"):
+            OutstandingToken.objects.create(user=self.admin_user, jti=jti, token="t", expires_at=expires)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/token_blacklist/outstandingtoken/", {"q": "abc123"})
+        self.assertEqual([token.jti for token in response.context["cl"].result_list], ["abc123"])
+        sql = [query["sql"] for query in queries if "token_blacklist_outstandingtoken" in query["sql"]]
+        self.assertTrue(any('"jti" = ' in query for query in sql))
+        self.assertFalse(any("LIKE" in query for query in sql))
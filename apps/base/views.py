@@ -1,3 +1,83 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
 from django.shortcuts import render
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .serializers import EXPAND_PARAM, parse_field_list
 
 # Create your views here.
+
+
+class ConditionalGetMixin:
+    """
+    为 ModelViewSet 的 list/retrieve 提供 ETag 和 Last-Modified。
+
+    ETag 由行数和 MAX(updated_field)(列表)或该行的 updated_field(详情)得出，不对响应体做哈希；
+    命中 If-None-Match / If-Modified-Since 时直接返回 304，不做序列化。
+    模型的批量更新需要同时写入 updated_field，否则 ETag 不会变化。
+    带 ?expand= 的请求包含关联对象，它们的修改不反映在 updated_field 中，不做条件响应。
+    """
+    updated_field = 'updated_at'
+
+    def is_conditional(self, request):
+        return not parse_field_list(request, EXPAND_PARAM)
+
+    def get_etag_variant(self, request):
+        # 同一数据的不同表示(地址、查询参数、渲染格式)使用不同的 ETag
+        key = '%s|%s' % (request.build_absolute_uri(), request.accepted_renderer.format)
+        return hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+
+    def conditional_response(self, request, marker, last_modified):
+        # 弱 ETag：标识的是数据版本而不是响应的字节
+        etag = 'W/%s' % quote_etag('%s-%s' % (marker, self.get_etag_variant(request)))
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        return response, etag, timestamp
+
+    @staticmethod
+    def set_conditional_headers(response, etag, timestamp):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_conditional(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(count=Count('pk'), last=Max(self.updated_field))
+        last = state['last']
+        marker = 'l%d-%d' % (state['count'], int(last.timestamp() * 1e6) if last else 0)
+        response, etag, timestamp = self.conditional_response(request, marker, last)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self.set_conditional_headers(response, etag, timestamp)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_conditional(request):
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        last = getattr(instance, self.updated_field)
+        marker = 'r%s-%d' % (instance.pk, int(last.timestamp() * 1e6) if last else 0)
+        response, etag, timestamp = self.conditional_response(request, marker, last)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return self.set_conditional_headers(response, etag, timestamp)
+
+
+class SparseFieldsViewMixin:
+    """
+    读请求按序列化器剩下的字段(?fields= / ?expand=)收窄查询，序列化器需要继承 base.serializers.SparseFieldsMixin。
+    """
+    # 视图本身需要的列，例如 ConditionalGetMixin 的 updated_field
+    required_columns = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            queryset = self.get_serializer().narrow_queryset(queryset, self.required_columns)
+        return queryset
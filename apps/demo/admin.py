@@ -1,8 +1,14 @@
 from django.contrib import admin
-
-# Register your models here.
-from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+
+from base.admin import LargeTableAdminMixin
 from .models import User
 
-admin.site.register(User, UserAdmin)
+
+class DemoUserAdmin(LargeTableAdminMixin, UserAdmin):
+    search_fields = ()
+    exact_search_fields = ('username', 'id')
+    ordering = ('-id',)
+
+
+admin.site.register(User, DemoUserAdmin)
@@ -1,17 +1,78 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from rest_framework import HTTP_HEADER_ENCODING, authentication
 
+from base.routers import stick_to_primary
+
 from .exceptions import AuthenticationFailed, InvalidToken, TokenError
-from .tokens import AccessToken
+from .log import record_timing, user_id_var
+from .metrics import AUTH_FAILURES
+from .state import token_backend
+from .tokens import AccessToken, SlidingToken
 
 
 # 认证方式 如Bearer
 AUTH_HEADER_TYPES = ('Bearer',)
 AUTH_HEADER_TYPE_BYTES = {h.encode(HTTP_HEADER_ENCODING) for h in AUTH_HEADER_TYPES}
-AUTH_TOKEN_CLASSES = (AccessToken,)
+AUTH_TOKEN_CLASSES = (AccessToken, SlidingToken)
 USER_ID_CLAIM = "user_id"
 USER_ID_FIELD = "id"
+# 校验失败的令牌在这段时间内直接返回缓存的错误
+NEGATIVE_CACHE_SIZE = getattr(settings, "JWT_NEGATIVE_CACHE_SIZE", 10000)
+NEGATIVE_CACHE_TTL = getattr(settings, "JWT_NEGATIVE_CACHE_TTL", 30)
+
+
+class NegativeTokenCache:
+    """
+    有界、短 TTL 的无效令牌缓存，键为令牌的哈希，值为校验失败时抛出的异常。
+    超过容量时淘汰最早写入的条目。
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        if isinstance(token, str):
+            token = token.encode("utf-8", "replace")
+        return hashlib.blake2b(token, digest_size=16).digest()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        error, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return error
+
+    def set(self, key, error):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (error, time.monotonic() + self.ttl)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+negative_token_cache = NegativeTokenCache(NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL)
+
+
+@lru_cache(maxsize=1)
+def malformed_token_error():
+    # 结构检查失败时共用的异常，第一次使用时才构造(需要翻译已就绪)
+    return InvalidToken(_("Token is malformed"))
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -27,14 +88,27 @@ class JWTAuthentication(authentication.BaseAuthentication):
         self.user_model = get_user_model()
 
     def authenticate(self, request):
+        try:
+            return self._authenticate(request)
+        except AuthenticationFailed as e:
+            AUTH_FAILURES.labels(e.detail.get("code", "authentication_failed")).inc()
+            raise
+
+    def _authenticate(self, request):
         header = self.get_header(request)
         if header is None:
             return None
         raw_token = self.get_raw_token(header)
         if raw_token is None:
             return None
+        started = time.perf_counter()
         validated_token = self.get_validated_token(raw_token)
-        return self.get_user(validated_token), validated_token
+        # 用户刚写入过时，本次请求改读主库
+        stick_to_primary(validated_token.get(USER_ID_CLAIM))
+        user = self.get_user(validated_token)
+        record_timing("authenticate", started)
+        user_id_var.set(user.pk)
+        return user, validated_token
 
     def authenticate_header(self, request):
         """
@@ -81,7 +155,16 @@ class JWTAuthentication(authentication.BaseAuthentication):
     def get_validated_token(self, raw_token):
         """
         验证一个编码的JSON web令牌，并返回一个验证的令牌包装器对象。
+        先做不含加密运算的结构检查，再查无效令牌缓存，最后才完整校验。
         """
+        if token_backend.precheck(raw_token) is not None:
+            raise malformed_token_error().with_traceback(None)
+
+        key = negative_token_cache.key(raw_token)
+        error = negative_token_cache.get(key)
+        if error is not None:
+            raise error.with_traceback(None)
+
         messages = []
         for AuthToken in AUTH_TOKEN_CLASSES:
             try:
@@ -95,12 +178,14 @@ class JWTAuthentication(authentication.BaseAuthentication):
                     }
                 )
 
-        raise InvalidToken(
+        error = InvalidToken(
             {
                 "detail": _("Given token not valid for any token type"),
                 "messages": messages,
             }
         )
+        negative_token_cache.set(key, error)
+        raise error
 
     def get_user(self, validated_token):
         """
@@ -113,11 +198,22 @@ class JWTAuthentication(authentication.BaseAuthentication):
             raise InvalidToken(_("Token contained no recognizable user identification"))
 
         try:
+            # 经由 ReplicaRouter 读副本，写入后的粘滞窗口内读主库；吊销由缓存中的令牌代数立即生效
             user = self.user_model.objects.get(**{USER_ID_FIELD: user_id})
         except self.user_model.DoesNotExist:
             raise AuthenticationFailed(_("User not found"), code="user_not_found")
 
+        if getattr(user, "is_deleted", False):
+            # 软删除的用户视为不存在
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
         if not user.is_active:
             raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
 
+        # 代数从缓存读取，revoke_tokens() 会同时更新缓存，吊销立即生效
+        try:
+            validated_token.check_generation()
+        except TokenError as e:
+            raise AuthenticationFailed(e.args[0], code="token_revoked")
+
         return user
@@ -1,12 +1,21 @@
+import binascii
 import json
+import re
+import time
+from base64 import urlsafe_b64decode
+from calendar import timegm
+from datetime import datetime
 from datetime import timedelta
 from typing import Optional, Type, Union
 
 import jwt
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from jwt import InvalidAlgorithmError, InvalidTokenError, algorithms
+from jwt import DecodeError, InvalidAlgorithmError, InvalidTokenError, algorithms, api_jws
 
+from .codec import get_codec
 from .exceptions import TokenBackendError
+from .metrics import TOKEN_DECODE_SECONDS
 from .utils import format_lazy
 
 try:
@@ -26,8 +35,52 @@ ALLOWED_ALGORITHMS = {
     "ES256",
     "ES384",
     "ES512",
+    "EdDSA",
 }
 
+# 解码前结构检查的上限，超过的令牌直接拒绝
+MAX_TOKEN_SIZE = getattr(settings, "JWT_MAX_TOKEN_SIZE", 4096)
+MAX_HEADER_SIZE = 256
+_BASE64URL_SEGMENTS = re.compile(rb"[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+")
+
+_decode_seconds = TOKEN_DECODE_SECONDS.labels()
+
+
+class CodecJWT(jwt.PyJWT):
+    """
+    使用 demo.codec 编解码载荷的 PyJWT，签名和声明校验仍由 PyJWT 完成。
+    """
+
+    def __init__(self, codec, options=None):
+        super().__init__(options)
+        self.codec = codec
+
+    def encode(self, payload, key, algorithm="HS256", headers=None, json_encoder=None):
+        payload = dict(payload)
+        for time_claim in ("exp", "iat", "nbf"):
+            if isinstance(payload.get(time_claim), datetime):
+                payload[time_claim] = timegm(payload[time_claim].utctimetuple())
+        return api_jws.encode(self.codec.dumps(payload), key, algorithm, headers, json_encoder)
+
+    def decode_complete(self, jwt, key="", algorithms=None, options=None, **kwargs):
+        options = dict(options or {})
+        options.setdefault("verify_signature", True)
+        if not options["verify_signature"]:
+            for option in ("verify_exp", "verify_nbf", "verify_iat", "verify_aud", "verify_iss"):
+                options.setdefault(option, False)
+
+        decoded = api_jws.decode_complete(jwt, key=key, algorithms=algorithms, options=options, **kwargs)
+        try:
+            payload = self.codec.loads(decoded["payload"])
+        except ValueError as e:
+            raise DecodeError("Invalid payload string: %s" % e)
+        if not isinstance(payload, dict):
+            raise DecodeError("Invalid payload string: must be a json object")
+
+        self._validate_claims(payload, {**self.options, **options}, **kwargs)
+        decoded["payload"] = payload
+        return decoded
+
 # Token验证后端 来自simple-jwt
 class TokenBackend:
     def __init__(
@@ -40,12 +93,17 @@ class TokenBackend:
         jwk_url: str = None,
         leeway: Union[float, int, timedelta] = None,
         json_encoder: Optional[Type[json.JSONEncoder]] = None,
+        key_id: str = None,
     ):
         self._validate_algorithm(algorithm)
 
         self.algorithm = algorithm
-        self.signing_key = signing_key
-        self.verifying_key = verifying_key
+        self.signing_key = self.load_key(signing_key)
+        self.verifying_key = self.load_key(verifying_key)
+        if not self.verifying_key and hasattr(self.signing_key, "public_key"):
+            # 非对称算法只配置了私钥时，从私钥导出公钥
+            self.verifying_key = self.signing_key.public_key()
+        self.key_id = key_id
         self.audience = audience
         self.issuer = issuer
 
@@ -56,6 +114,8 @@ class TokenBackend:
 
         self.leeway = leeway
         self.json_encoder = json_encoder
+        self.codec = get_codec(json_encoder)
+        self.jwt = CodecJWT(self.codec)
 
     def _validate_algorithm(self, algorithm):
         """
@@ -73,6 +133,26 @@ class TokenBackend:
                 )
             )
 
+    def load_key(self, key):
+        """
+        非对称算法的 PEM 密钥在初始化时解析一次，避免每次签名、验签都重新解析。
+        """
+        if not key or self.algorithm.startswith("HS"):
+            return key
+        return algorithms.get_default_algorithms()[self.algorithm].prepare_key(key)
+
+    def get_jwks(self):
+        """
+        以 JWKS 格式返回验签公钥，供下游服务离线验证令牌；对称算法不公开任何密钥。
+        """
+        if self.algorithm.startswith("HS") or not self.verifying_key:
+            return {"keys": []}
+        jwk = json.loads(algorithms.get_default_algorithms()[self.algorithm].to_jwk(self.verifying_key))
+        jwk.update(use="sig", alg=self.algorithm)
+        if self.key_id is not None:
+            jwk["kid"] = self.key_id
+        return {"keys": [jwk]}
+
     def get_leeway(self) -> timedelta:
         if self.leeway is None:
             return timedelta(seconds=0)
@@ -99,6 +179,36 @@ class TokenBackend:
 
         return self.verifying_key
 
+    def precheck(self, token):
+        """
+        不做任何加密运算的结构检查：长度、三段 base64url、头部的 alg 与 typ。
+        通过时返回 None，否则返回失败原因(普通字符串，不构造异常和翻译消息)。
+        """
+        if isinstance(token, str):
+            try:
+                token = token.encode("ascii")
+            except UnicodeEncodeError:
+                return "invalid characters"
+        if len(token) > MAX_TOKEN_SIZE:
+            return "token too large"
+        if _BASE64URL_SEGMENTS.fullmatch(token) is None:
+            return "not three base64url segments"
+
+        header_segment = token[:token.index(b".")]
+        if len(header_segment) > MAX_HEADER_SIZE:
+            return "header too large"
+        try:
+            header = self.codec.loads(urlsafe_b64decode(header_segment + b"=" * (-len(header_segment) % 4)))
+        except (binascii.Error, ValueError):
+            return "invalid header"
+        if not isinstance(header, dict):
+            return "invalid header"
+        if header.get("alg") != self.algorithm:
+            return "unexpected algorithm"
+        if header.get("typ", "JWT") != "JWT":
+            return "unexpected type"
+        return None
+
     def encode(self, payload):
         """
         Returns an encoded token for the given payload dictionary.
@@ -109,10 +219,11 @@ class TokenBackend:
         if self.issuer is not None:
             jwt_payload["iss"] = self.issuer
 
-        token = jwt.encode(
+        token = self.jwt.encode(
             jwt_payload,
             self.signing_key,
             algorithm=self.algorithm,
+            headers={"kid": self.key_id} if self.key_id is not None else None,
             json_encoder=self.json_encoder,
         )
         if isinstance(token, bytes):
@@ -121,13 +232,15 @@ class TokenBackend:
         # For PyJWT >= 2.0.0a1
         return token
 
-    def decode(self, token, verify=True):
+    def decode(self, token, verify=True, verify_exp=True):
         """
         执行给定令牌的验证并返回其有效负载字典。
         如果令牌格式不正确，如果它的签名检查失败，或者它的 exp 声明表明它已经过期，则引发 TokenBackendError 。
+        verify_exp 为假时只校验签名，不检查过期(用于区分过期和签名错误)。
         """
+        started = time.perf_counter()
         try:
-            return jwt.decode(
+            return self.jwt.decode(
                 token,
                 self.get_verifying_key(token),
                 algorithms=[self.algorithm],
@@ -137,9 +250,12 @@ class TokenBackend:
                 options={
                     "verify_aud": self.audience is not None,
                     "verify_signature": verify,
+                    "verify_exp": verify and verify_exp,
                 },
             )
         except InvalidAlgorithmError as ex:
             raise TokenBackendError(_("Invalid algorithm specified")) from ex
         except InvalidTokenError:
             raise TokenBackendError(_("Token is invalid or expired"))
+        finally:
+            _decode_seconds.observe(time.perf_counter() - started)
@@ -0,0 +1,12 @@
+from base.backfill import parse_legacy_datetime, register
+
+# demo.User 的字符串时间列迁移为 DateTimeField
+USER_TIMESTAMPS = register(
+    "demo.User.timestamps",
+    "demo.User",
+    [
+        ("created_at", "created_at_dt", parse_legacy_datetime),
+        ("deleted_at", "deleted_at_dt", parse_legacy_datetime),
+        ("last_login", "last_login_dt", parse_legacy_datetime),
+    ],
+)
@@ -0,0 +1,68 @@
+"""
+JSON 编解码器，令牌载荷和 REST 接口的渲染、解析共用。
+
+启动时检测 orjson，不可用时回退到标准库 json；两种实现的输出都是紧凑(无空白)、键排序、UTF-8 的，
+对同一对象输出相同的字节。标准库不认识的类型(日期时间、惰性翻译字符串、Decimal 等)统一交给
+DRF 的 JSONEncoder.default 处理，保证格式与 DRF 一致。
+"""
+import json
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "orjson" / "json"，None 表示自动检测
+JSON_CODEC = getattr(settings, "JSON_CODEC", None)
+
+
+class StdlibCodec:
+    name = "json"
+
+    def __init__(self, encoder=JSONEncoder):
+        self.encoder = encoder or JSONEncoder
+
+    def dumps(self, obj):
+        return json.dumps(
+            obj, cls=self.encoder, separators=(",", ":"), sort_keys=True, ensure_ascii=False
+        ).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    # 日期时间交给 default，与 DRF 的格式保持一致
+    options = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def __init__(self, encoder=JSONEncoder):
+        self.default = (encoder or JSONEncoder)().default
+        self.fallback = StdlibCodec(encoder)
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            # 超过 64 位的整数等 orjson 不支持的值
+            return self.fallback.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+CODECS = {StdlibCodec.name: StdlibCodec}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec
+
+
+def get_codec(encoder=None, name=JSON_CODEC):
+    if name is None:
+        name = OrjsonCodec.name if orjson is not None else StdlibCodec.name
+    return CODECS[name](encoder)
+
+
+codec = get_codec()
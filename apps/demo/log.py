@@ -0,0 +1,161 @@
+"""
+demo 应用的日志管道。
+
+日志记录先放入有界队列，由后台线程写出；队列满时直接丢弃，不阻塞请求线程。
+每个日志分类(logger 名称前缀)可以配置采样率，记录以 JSON 输出并带上请求 id、用户 id 和阶段耗时。
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+request_id_var = ContextVar("request_id", default=None)
+user_id_var = ContextVar("user_id", default=None)
+timings_var = ContextVar("timings", default=None)
+# 只用来格式化异常堆栈
+_exception_formatter = logging.Formatter()
+
+
+def record_timing(phase, started):
+    """
+    记录当前请求中某个阶段从 started(perf_counter) 到现在的耗时。
+    """
+    timings = timings_var.get()
+    if timings is not None:
+        timings[phase] = round((time.perf_counter() - started) * 1000, 3)
+
+
+class ContextFilter(logging.Filter):
+    """
+    把当前请求的上下文附加到日志记录上。
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        if getattr(record, "user_id", None) is None:
+            record.user_id = user_id_var.get()
+        return True
+
+
+class SamplingQueueHandler(QueueHandler):
+    """
+    按 logger 分类采样并放入有界队列的处理器，队列满时丢弃并计数。
+
+    给出 target 时，由后台线程把队列中的记录交给 target 写出。后台线程在每个进程第一次写日志时才启动：
+    fork 出的子进程(如 gunicorn --preload 的 worker)不会继承父进程的线程，在子进程中换用新的队列并重新启动。
+    """
+
+    def __init__(self, log_queue, rates=None, default_rate=1.0, target=None):
+        super().__init__(log_queue)
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.target = target
+        self.listener = None
+        self.dropped = 0
+        self._rate_cache = {}
+        self._random = random.random
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+        self.addFilter(ContextFilter())
+        if target is not None:
+            atexit.register(self.stop_listener)
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def start_listener(self):
+        with self._listener_lock:
+            pid = os.getpid()
+            if self._listener_pid == pid:
+                return
+            if self._listener_pid is not None:
+                # 父进程的队列可能还有父进程自己会写出的记录，锁也可能在 fork 时被持有
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self._listener_pid = pid
+
+    def stop_listener(self):
+        # 只停止本进程启动的线程，子进程退出时不去碰父进程的队列
+        if self.listener is not None and self._listener_pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._listener_pid = None
+
+    def _after_fork_in_child(self):
+        self._listener_lock = threading.Lock()
+
+    def get_rate(self, name):
+        rate = self._rate_cache.get(name)
+        if rate is None:
+            # 最长前缀匹配，结果按 logger 名称缓存
+            rate = self.default_rate
+            best = -1
+            for prefix, prefix_rate in self.rates.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                    rate, best = prefix_rate, len(prefix)
+            self._rate_cache[name] = rate
+        return rate
+
+    def handle(self, record):
+        # WARNING 以上的记录不采样
+        if record.levelno < logging.WARNING:
+            rate = self.get_rate(record.name)
+            if rate < 1.0 and self._random() >= rate:
+                return False
+        return super().handle(record)
+
+    def prepare(self, record):
+        # 消息和异常堆栈在请求线程中格式化，后台线程只负责序列化和写出
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.target is not None and self._listener_pid != os.getpid():
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    fields = ("request_id", "user_id", "timings")
+
+    def format(self, record):
+        data = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def make_queue_handler(maxsize=10000, rates=None, default_rate=1.0, stream=None):
+    """
+    供 LOGGING 配置使用的工厂函数：创建处理器，后台写线程在第一次写日志时启动。
+    """
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JSONFormatter())
+    return SamplingQueueHandler(queue.Queue(maxsize=maxsize), rates=rates, default_rate=default_rate, target=target)
@@ -0,0 +1,178 @@
+import json
+import multiprocessing
+import os
+import platform
+import time
+from os import urandom
+
+import jwt
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from jwt import algorithms
+
+from demo.backends import ALLOWED_ALGORITHMS, TokenBackend
+from demo.tokens import RefreshToken
+
+if algorithms.has_crypto:
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+    from cryptography.hazmat.primitives.serialization import (
+        Encoding, NoEncryption, PrivateFormat, PublicFormat,
+    )
+
+    CURVES = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}
+
+ALGORITHM_ORDER = ("HS256", "HS384", "HS512", "RS256", "RS384", "RS512", "ES256", "ES384", "ES512", "EdDSA")
+
+
+def generate_keys(algorithm):
+    """
+    生成一次性的 (签名密钥, 验签密钥)，非对称算法返回 PEM 字符串。
+    """
+    if algorithm.startswith("HS"):
+        secret = urandom(64).hex()
+        return secret, secret
+    if algorithm.startswith("RS"):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm.startswith("ES"):
+        private_key = ec.generate_private_key(CURVES[algorithm]())
+    else:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    signing_key = private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption())
+    verifying_key = private_key.public_key().public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo)
+    return signing_key.decode(), verifying_key.decode()
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, arg, number):
+    """
+    逐次计时，返回 (开始时刻, 结束时刻, 每次耗时列表)，时刻使用跨进程可比较的 monotonic 时钟。
+    """
+    timer = time.perf_counter
+    latencies = []
+    started = time.monotonic()
+    for _ in range(number):
+        t0 = timer()
+        func(arg)
+        latencies.append(timer() - t0)
+    return started, time.monotonic(), latencies
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "ops_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_us": round(percentile(latencies, 0.50) * 1e6, 2),
+        "p90_us": round(percentile(latencies, 0.90) * 1e6, 2),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 2),
+    }
+
+
+def run_worker(args):
+    algorithm, signing_key, verifying_key, payload, number = args
+    backend = TokenBackend(algorithm, signing_key, verifying_key)
+    token = backend.encode(payload)
+    encode = measure(backend.encode, payload, number)
+    decode = measure(backend.decode, token, number)
+    return encode[:2], decode[:2]
+
+
+class Command(BaseCommand):
+    help = "Benchmarks encode/decode of every allowed JWT algorithm with throwaway keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=2000, help="Operations per measurement and process")
+        parser.add_argument(
+            "--processes", type=int, default=os.cpu_count(),
+            help="Processes for the parallel run, 1 disables it",
+        )
+        parser.add_argument("--algorithm", action="append", dest="algorithms", help="Limit to these algorithms")
+        parser.add_argument("--json", dest="json_path", help="Write the JSON report to this file, '-' for stdout")
+
+    def handle(self, *args, **kwargs):
+        names = kwargs["algorithms"] or [a for a in ALGORITHM_ORDER if a in ALLOWED_ALGORITHMS]
+        unknown = set(names) - ALLOWED_ALGORITHMS
+        if unknown:
+            raise CommandError("Unknown algorithms: %s" % ", ".join(sorted(unknown)))
+
+        # 与真实登录相同形状的载荷，不需要真实用户
+        payload = RefreshToken.for_user(get_user_model()(id=123456)).payload
+        number, processes = kwargs["number"], kwargs["processes"]
+
+        results, skipped = [], []
+        for algorithm in names:
+            if algorithm in algorithms.requires_cryptography and not algorithms.has_crypto:
+                skipped.append(algorithm)
+                continue
+            results.append(self.benchmark(algorithm, payload, number, processes))
+
+        report = {
+            "host": {
+                "cpu_count": os.cpu_count(),
+                "machine": platform.machine(),
+                "python": platform.python_version(),
+                "pyjwt": jwt.__version__,
+            },
+            "number": number,
+            "processes": processes,
+            "payload_claims": sorted(payload),
+            "results": results,
+            "skipped": skipped,
+        }
+        self.write_table(report)
+        if kwargs["json_path"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+        elif kwargs["json_path"]:
+            with open(kwargs["json_path"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    def benchmark(self, algorithm, payload, number, processes):
+        signing_key, verifying_key = generate_keys(algorithm)
+        backend = TokenBackend(algorithm, signing_key, verifying_key)
+        token = backend.encode(payload)
+
+        encode_start, encode_end, encode_latencies = measure(backend.encode, payload, number)
+        decode_start, decode_end, decode_latencies = measure(backend.decode, token, number)
+        result = {
+            "algorithm": algorithm,
+            "token_bytes": len(token),
+            "signature_bytes": len(token) - token.rindex(".") - 1,
+            "encode": summarize(encode_latencies, encode_end - encode_start),
+            "decode": summarize(decode_latencies, decode_end - decode_start),
+        }
+
+        if processes > 1:
+            worker_args = [(algorithm, signing_key, verifying_key, payload, number)] * processes
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                spans = pool.map(run_worker, worker_args)
+            # 总吞吐量 = 所有进程的操作数 / 从最早开始到最晚结束的时间
+            result["parallel"] = {
+                "encode_ops_per_sec": round(
+                    number * processes / (max(s[0][1] for s in spans) - min(s[0][0] for s in spans)), 1
+                ),
+                "decode_ops_per_sec": round(
+                    number * processes / (max(s[1][1] for s in spans) - min(s[1][0] for s in spans)), 1
+                ),
+            }
+        return result
+
+    def write_table(self, report):
+        row = "{:<7} {:>6} {:>5} {:>11} {:>9} {:>9} {:>11} {:>9} {:>9} {:>13} {:>13}"
+        self.stdout.write(row.format(
+            "alg", "bytes", "sig", "enc op/s", "enc p50", "enc p99", "dec op/s", "dec p50", "dec p99",
+            "enc op/s xN", "dec op/s xN",
+        ))
+        for r in report["results"]:
+            parallel = r.get("parallel", {})
+            self.stdout.write(row.format(
+                r["algorithm"], r["token_bytes"], r["signature_bytes"],
+                r["encode"]["ops_per_sec"], r["encode"]["p50_us"], r["encode"]["p99_us"],
+                r["decode"]["ops_per_sec"], r["decode"]["p50_us"], r["decode"]["p99_us"],
+                parallel.get("encode_ops_per_sec", "-"), parallel.get("decode_ops_per_sec", "-"),
+            ))
+        self.stdout.write("latencies in microseconds, xN = %d processes" % report["processes"])
+        if report["skipped"]:
+            self.stderr.write("skipped (cryptography not installed): %s" % ", ".join(report["skipped"]))
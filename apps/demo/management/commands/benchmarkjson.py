@@ -0,0 +1,59 @@
+import io
+import timeit
+
+from django.core.management.base import BaseCommand
+from rest_framework import parsers, renderers
+from rest_framework.test import APIRequestFactory
+
+from demo.backends import CodecJWT
+from demo.codec import CODECS, get_codec
+from demo.models import User
+from demo.serializers import UserSerializer
+from demo.tokens import RefreshToken
+
+
+class Command(BaseCommand):
+    help = "Compares the available JSON codecs on token payloads and on a rendered user list"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=2000)
+        parser.add_argument("--rows", type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        number, rows = kwargs["number"], kwargs["rows"]
+        self.stdout.write("{:<14} {:<10} {:>8} {:>12} {:>12}".format("case", "codec", "bytes", "dumps(us)", "loads(us)"))
+
+        # 令牌：与登录接口相同形状的载荷，签名开销对两种编解码器相同
+        payload = RefreshToken.for_user(User(id=123456)).payload
+        for name in CODECS:
+            jwt = CodecJWT(get_codec(name=name))
+            token = jwt.encode(payload, "secret", algorithm="HS256")
+            self.row("token", name, len(token), number,
+                     lambda: jwt.encode(payload, "secret", algorithm="HS256"),
+                     lambda: jwt.decode(token, "secret", algorithms=["HS256"]))
+
+        # 用户列表：序列化一次，只比较渲染和解析
+        request = APIRequestFactory().get("/demo/user/")
+        users = [User(id=i, username="user%d" % i, nickname="用户%d" % i, email="user%d@example.com" % i)
+                 for i in range(1, rows + 1)]
+        data = UserSerializer(users, many=True, context={"request": request}).data
+        list_number = max(1, number // 100)
+
+        drf_renderer, drf_parser = renderers.JSONRenderer(), parsers.JSONParser()
+        body = drf_renderer.render(data)
+        self.row("users[%d]" % rows, "drf", len(body), list_number,
+                 lambda: drf_renderer.render(data),
+                 lambda: drf_parser.parse(io.BytesIO(body)))
+        for name in CODECS:
+            codec = get_codec(name=name)
+            body = codec.dumps(data)
+            self.row("users[%d]" % rows, name, len(body), list_number,
+                     lambda: codec.dumps(data),
+                     lambda: codec.loads(body))
+
+    def row(self, case, name, size, number, dumps, loads):
+        self.stdout.write("{:<14} {:<10} {:>8} {:>12.2f} {:>12.2f}".format(
+            case, name, size,
+            timeit.timeit(dumps, number=number) / number * 1e6,
+            timeit.timeit(loads, number=number) / number * 1e6,
+        ))
@@ -0,0 +1,50 @@
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from demo.tokens import AccessToken, RefreshToken
+
+
+class CompactAccessToken(AccessToken):
+    compact_claims = True
+
+
+class CompactRefreshToken(RefreshToken):
+    compact_claims = True
+    access_token_class = CompactAccessToken
+
+
+class Command(BaseCommand):
+    help = "Compares byte size and encode/decode time of the standard and compact token formats"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=5000)
+
+    def handle(self, *args, **kwargs):
+        number = kwargs["number"]
+        # 不需要真实用户，只需要一个带 id 的对象
+        user = get_user_model()(id=123456)
+
+        self.stdout.write(
+            "{:<10} {:<8} {:>6} {:>12} {:>12}".format(
+                "format", "type", "bytes", "encode(us)", "decode(us)"
+            )
+        )
+        for name, refresh_class in (("standard", RefreshToken), ("compact", CompactRefreshToken)):
+            refresh = refresh_class.for_user(user)
+            access = refresh.access_token
+            for token in (refresh, access):
+                encoded = str(token)
+                token_class = type(token)
+                encode_time = timeit.timeit(lambda: str(token), number=number)
+                decode_time = timeit.timeit(lambda: token_class(encoded), number=number)
+                self.stdout.write(
+                    "{:<10} {:<8} {:>6} {:>12.2f} {:>12.2f}".format(
+                        name,
+                        token.token_type,
+                        len(encoded),
+                        encode_time / number * 1e6,
+                        decode_time / number * 1e6,
+                    )
+                )
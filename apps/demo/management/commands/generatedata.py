@@ -0,0 +1,187 @@
+import multiprocessing
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+
+from demo.models import User
+from demo.tokens import GENERATION_CLAIM, JTI_CLAIM, USER_ID_CLAIM, RefreshToken
+from token_blacklist.models import OutstandingToken
+
+SYNTHETIC_USER_PREFIX = "synth-"
+# 预先计算的密码哈希数量，每个用户从中取一个，避免逐行执行 PBKDF2
+PASSWORD_POOL_SIZE = 8
+# 用户属性的分布
+USER_TYPE_WEIGHTS = {"default": 85, "enterprise": 10, "trial": 5}
+INACTIVE_RATE = 0.05
+STAFF_RATE = 0.001
+DELETED_RATE = 0.08
+NEVER_LOGGED_IN_RATE = 0.2
+
+
+def password_pool(seed, size=PASSWORD_POOL_SIZE):
+    """
+    返回 size 个密码哈希，盐由 seed 决定，相同的 seed 得到相同的哈希；明文为 synthetic-<i>。
+    """
+    return [
+        make_password("synthetic-%d" % i, salt="synth%dx%d" % (seed, i), hasher="pbkdf2_sha256")
+        for i in range(size)
+    ]
+
+
+def skewed_time(rng, now, days):
+    # 平方使时间集中在最近，接近持续增长的用户量
+    return now - timedelta(days=days * rng.random() ** 2)
+
+
+def build_users(rng, indexes, options, passwords):
+    now, types = options["now"], list(USER_TYPE_WEIGHTS)
+    weights = list(USER_TYPE_WEIGHTS.values())
+    users = []
+    for index in indexes:
+        created_at = skewed_time(rng, now, options["days"])
+        user = User(
+            id=options["start_id"] + index,
+            username="%s%09d" % (options["prefix"], index),
+            nickname="用户%d" % index,
+            email="%s%d@example.com" % (options["prefix"], index),
+            password=rng.choice(passwords),
+            type=rng.choices(types, weights)[0],
+            is_active=rng.random() >= INACTIVE_RATE,
+            is_staff=rng.random() < STAFF_RATE,
+            created_at=created_at,
+            date_joined=created_at,
+        )
+        if user.is_staff:
+            # 合成密码的明文是已知的，管理员账号使用不可用的密码，不能登录
+            user.password = UNUSABLE_PASSWORD_PREFIX + "%040x" % rng.getrandbits(160)
+        if rng.random() >= NEVER_LOGGED_IN_RATE:
+            user.last_login = created_at + (now - created_at) * rng.random()
+        if rng.random() < DELETED_RATE:
+            user.deleted_at = created_at + (now - created_at) * rng.random()
+        # bulk_create 不调用 save()，旧字符串时间字段需要手动同步
+        user.sync_legacy_timestamps()
+        users.append(user)
+    return users
+
+
+def build_tokens(rng, users, options):
+    now, mean = options["now"], options["tokens_per_user"]
+    tokens = []
+    for user in users:
+        # 已删除或停用的用户不再登录，令牌更少
+        user_mean = mean / 4 if user.deleted_at or not user.is_active else mean
+        count = int(rng.expovariate(1 / user_mean) + 0.5) if user_mean > 0 else 0
+        for _ in range(count):
+            issued_at = max(user.created_at, skewed_time(rng, now, options["token_days"]))
+            token = RefreshToken()
+            token[JTI_CLAIM] = uuid.UUID(int=rng.getrandbits(128), version=4).hex
+            token[USER_ID_CLAIM] = user.id
+            token[GENERATION_CLAIM] = 0
+            token.set_iat(at_time=issued_at)
+            token.set_exp(from_time=issued_at)
+            tokens.append(OutstandingToken(
+                user_id=user.id,
+                jti=token[JTI_CLAIM],
+                token=str(token),
+                created_at=issued_at,
+                expires_at=issued_at + token.lifetime,
+            ))
+    return tokens
+
+
+def generate_chunk(args):
+    """
+    生成第 chunk 块的用户和令牌。随机数只由 seed 和块号决定，块可以以任意顺序、在任意进程中生成；
+    插入忽略冲突，重跑某一块不会产生重复数据。
+    """
+    chunk, options, passwords = args
+    rng = random.Random("%d:%d" % (options["seed"], chunk))
+    start = chunk * options["chunk_size"]
+    end = min(start + options["chunk_size"], options["users"])
+    batch_size = options["batch_size"]
+    started = time.perf_counter()
+    user_count = token_count = 0
+    for batch_start in range(start, end, batch_size):
+        users = build_users(rng, range(batch_start, min(batch_start + batch_size, end)), options, passwords)
+        tokens = build_tokens(rng, users, options)
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=batch_size, ignore_conflicts=True)
+            OutstandingToken.objects.bulk_create(tokens, batch_size=batch_size, ignore_conflicts=True)
+        user_count += len(users)
+        token_count += len(tokens)
+    return chunk, user_count, token_count, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Generates synthetic users and outstanding tokens for scale testing, deterministically from a seed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--tokens-per-user", type=float, default=3.0, help="Mean outstanding tokens per user")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--start-id", type=int, default=100000000, help="Primary key of the first user")
+        parser.add_argument("--prefix", default=SYNTHETIC_USER_PREFIX, help="Username prefix")
+        parser.add_argument("--days", type=int, default=730, help="Spread account creation over this many days")
+        parser.add_argument("--token-days", type=int, default=30, help="Spread token issue times over this many days")
+        parser.add_argument("--now", type=float, help="Reference epoch time; defaults to today 00:00 UTC")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--chunk-size", type=int, default=100000, help="Users per chunk")
+        parser.add_argument("--chunks", help="Only generate chunks START:END, e.g. to split work across hosts")
+        parser.add_argument("--processes", type=int, default=1)
+
+    def handle(self, *args, **kwargs):
+        if kwargs["now"] is not None:
+            now = datetime.fromtimestamp(kwargs["now"], tz=timezone.utc)
+        else:
+            now = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        options = {
+            key: kwargs[key] for key in (
+                "users", "tokens_per_user", "seed", "start_id", "prefix", "days", "token_days", "batch_size",
+                "chunk_size",
+            )
+        }
+        options["now"] = now
+        chunk_count = -(-options["users"] // options["chunk_size"])
+        chunks = range(chunk_count)
+        if kwargs["chunks"]:
+            try:
+                start, _, end = kwargs["chunks"].partition(":")
+                chunks = chunks[int(start or 0):int(end) if end else None]
+            except ValueError:
+                raise CommandError("--chunks must look like START:END")
+
+        passwords = password_pool(options["seed"])
+        work = [(chunk, options, passwords) for chunk in chunks]
+        self.stdout.write("Generating %d chunk(s) of up to %d users, reference time %s" % (
+            len(work), options["chunk_size"], now.isoformat()))
+
+        started = time.perf_counter()
+        totals = [0, 0]
+        if kwargs["processes"] <= 1:
+            results = map(generate_chunk, work)
+        else:
+            # 子进程各自建立数据库连接
+            connections.close_all()
+            pool = multiprocessing.get_context("fork").Pool(kwargs["processes"])
+            results = pool.imap_unordered(generate_chunk, work)
+        for chunk, user_count, token_count, elapsed in results:
+            totals[0] += user_count
+            totals[1] += token_count
+            self.stdout.write("chunk %d: %d users, %d tokens in %.1fs" % (chunk, user_count, token_count, elapsed))
+        if kwargs["processes"] > 1:
+            pool.close()
+            pool.join()
+
+        # 显式指定了主键，PostgreSQL 等需要把序列推进到最大值之后
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, OutstandingToken]):
+                cursor.execute(sql)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS("%d users, %d tokens in %.1fs (%.0f rows/s)" % (
+            totals[0], totals[1], elapsed, sum(totals) / elapsed if elapsed else 0)))
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from demo.models import User
+
+LOADTEST_USER_PREFIX = "loadtest-"
+LOADTEST_PASSWORD = "loadtest-password"
+DEFAULT_MIX = "login=1,list=8,create=1"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("login", "list", "create"):
+            raise CommandError("Unknown operation '%s' in --mix" % name)
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def http_request(host, port, method, path, body=None, token=None):
+    """
+    最小的 asyncio HTTP/1.1 客户端，每个请求使用一个连接，返回 (状态码, 响应体)。
+    响应为空或不完整时抛出 ValueError。
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        headers = [
+            "%s %s HTTP/1.1" % (method, path),
+            "Host: %s:%d" % (host, port),
+            "Connection: close",
+            "Accept: application/json",
+            "Content-Length: %d" % len(data),
+        ]
+        if body is not None:
+            headers.append("Content-Type: application/json")
+        if token is not None:
+            headers.append("Authorization: Bearer %s" % token)
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+
+    head, _, payload = response.partition(b"\r\n\r\n")
+    parts = head.split(b" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise ValueError("Malformed HTTP response: %r" % head[:100])
+    return int(parts[1]), payload
+
+
+class Command(BaseCommand):
+    help = "Drives concurrent login, list and create traffic against the demo API and reports latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Target an already running server instead of starting one")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--users", type=int, default=20, help="Number of seeded login users")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight when --rate is 0")
+        parser.add_argument("--rate", type=float, default=0, help="Requests per second, 0 for as fast as possible")
+        parser.add_argument("--mix", default=DEFAULT_MIX)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **kwargs):
+        self.mix = parse_mix(kwargs["mix"])
+        self.random = random.Random(kwargs["seed"])
+        self.usernames = self.seed_users(kwargs["users"])
+
+        server = None
+        if kwargs["url"]:
+            url = urlsplit(kwargs["url"])
+            self.host, self.port = url.hostname, url.port or 80
+        else:
+            self.host, self.port = "127.0.0.1", kwargs["port"]
+            server = self.start_server()
+
+        try:
+            report = asyncio.run(self.run(kwargs["requests"], kwargs["concurrency"], kwargs["rate"]))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        report["config"] = {
+            "requests": kwargs["requests"],
+            "concurrency": kwargs["concurrency"],
+            "rate": kwargs["rate"],
+            "mix": self.mix,
+            "users": kwargs["users"],
+            "seed": kwargs["seed"],
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def seed_users(self, count):
+        # 所有压测用户共用一个密码哈希，避免逐个计算 PBKDF2
+        password = User.make_password(LOADTEST_PASSWORD)
+        usernames = ["%s%d" % (LOADTEST_USER_PREFIX, i) for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        User.objects.bulk_create(
+            [
+                User(username=username, nickname=username, password=password)
+                for username in usernames
+                if username not in existing
+            ]
+        )
+        return usernames
+
+    def start_server(self):
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "runserver",
+                "%s:%d" % (self.host, self.port),
+                "--noreload",
+            ],
+            env=os.environ.copy(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError("Server exited with code %d" % process.returncode)
+            try:
+                socket.create_connection((self.host, self.port), timeout=0.5).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError("Server did not start on %s:%d" % (self.host, self.port))
+
+    async def do_login(self):
+        status, body = await http_request(
+            self.host,
+            self.port,
+            "POST",
+            "/demo/login/",
+            {"username": self.random.choice(self.usernames), "password": LOADTEST_PASSWORD},
+        )
+        if status == 200:
+            self.tokens.append(json.loads(body)["access"])
+        return status
+
+    async def do_list(self):
+        token = self.random.choice(self.tokens) if self.tokens else None
+        status, _ = await http_request(self.host, self.port, "GET", "/demo/user/", token=token)
+        return status
+
+    async def do_create(self):
+        self.created += 1
+        username = "%screated-%d-%d" % (LOADTEST_USER_PREFIX, os.getpid(), self.created)
+        status, _ = await http_request(
+            self.host,
+            self.port,
+            "POST",
+            "/demo/user/",
+            {"username": username, "nickname": username, "password": LOADTEST_PASSWORD},
+        )
+        return status
+
+    async def run(self, total, concurrency, rate):
+        self.tokens = []
+        self.created = 0
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        operations = self.random.choices(names, weights, k=total)
+        results = {name: {"latencies": [], "errors": 0, "statuses": {}} for name in names}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(name):
+            try:
+                return await getattr(self, "do_" + name)()
+            except (OSError, ValueError):
+                # 连接失败或响应不完整，计为错误
+                return 0
+
+        # 先登录一次，保证 list 请求有可用的令牌
+        await send("login")
+
+        async def issue(name, scheduled=None):
+            if scheduled is None:
+                async with semaphore:
+                    started = time.perf_counter()
+                    status = await send(name)
+            else:
+                # 开环压测从计划发送时间开始计时，排队的时间也算在延迟中
+                started = scheduled
+                status = await send(name)
+            elapsed = time.perf_counter() - started
+            result = results[name]
+            result["latencies"].append(elapsed)
+            result["statuses"][str(status)] = result["statuses"].get(str(status), 0) + 1
+            if not 200 <= status < 300:
+                result["errors"] += 1
+
+        started = time.perf_counter()
+        tasks = []
+        for i, name in enumerate(operations):
+            if rate:
+                # 开环压测：按计划时间发出请求，不受响应速度和 --concurrency 限制
+                scheduled = started + i / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(issue(name, scheduled)))
+            else:
+                tasks.append(asyncio.ensure_future(issue(name)))
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - started
+
+        return {
+            "duration": duration,
+            "throughput": total / duration,
+            "operations": {name: self.summarize(result, duration) for name, result in results.items()},
+        }
+
+    @staticmethod
+    def summarize(result, duration):
+        latencies = sorted(result["latencies"])
+        count = len(latencies)
+        return {
+            "count": count,
+            "throughput": count / duration,
+            "error_rate": result["errors"] / count if count else 0,
+            "statuses": result["statuses"],
+            "latency_ms": {
+                name: (percentile(latencies, fraction) or 0) * 1000
+                for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+            },
+        }
@@ -0,0 +1,58 @@
+import json
+import logging
+import time
+from urllib.parse import parse_qs
+
+from django.core.management.base import BaseCommand
+
+from demo.webhooks import HANDLERS, STATUS_FAILED, WEBHOOK_LEASE_SECONDS, webhook_queue
+
+logger = logging.getLogger("demo.webhooks")
+
+
+def parse_payload(payload):
+    # GitHub 可以配置为 application/x-www-form-urlencoded，此时 JSON 在 payload 字段中
+    if payload[:8] == b"payload=":
+        payload = parse_qs(payload.decode("utf-8"))["payload"][0]
+    return json.loads(payload)
+
+
+class Command(BaseCommand):
+    help = "Parses and dispatches queued webhook events outside the request path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--poll-interval", type=float, default=0.5)
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def handle(self, *args, **kwargs):
+        maintained_at = float("-inf")
+        while True:
+            # 回收过期租约、清理去重窗口之外的事件；可以同时运行多个处理进程
+            if time.monotonic() - maintained_at >= WEBHOOK_LEASE_SECONDS / 2:
+                webhook_queue.requeue_stale()
+                webhook_queue.purge()
+                maintained_at = time.monotonic()
+            rows = webhook_queue.claim(kwargs["batch_size"])
+            if rows:
+                self.dispatch(rows)
+            elif kwargs["once"]:
+                break
+            else:
+                time.sleep(kwargs["poll_interval"])
+
+    def dispatch(self, rows):
+        done, failed = [], []
+        for event_id, delivery_id, event, payload in rows:
+            handler = HANDLERS.get(event)
+            try:
+                if handler is not None:
+                    handler(parse_payload(payload))
+            except Exception:
+                logger.exception("webhook %s (%s) failed", delivery_id, event)
+                failed.append(event_id)
+            else:
+                done.append(event_id)
+        webhook_queue.finish(done)
+        if failed:
+            webhook_queue.finish(failed, STATUS_FAILED)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import struct
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+
+from demo.exceptions import TokenError
+from demo.tokens import AccessToken
+from token_blacklist.revocation import REVOCATION_RELOAD_INTERVAL
+
+# 帧格式: 请求为 4 字节大端长度 + 令牌; 响应为 1 字节状态 + 4 字节大端长度 + JSON 正文
+REQUEST_HEADER = struct.Struct(">I")
+RESPONSE_HEADER = struct.Struct(">BI")
+STATUS_VALID = 0
+STATUS_INVALID = 1
+STATUS_BAD_REQUEST = 2
+MAX_TOKEN_SIZE = 8192
+
+
+def verify_token(token):
+    """
+    使用 AccessToken 的校验规则校验令牌(签名、声明、吊销文件)，再检查令牌代数。
+    代数优先从缓存读取，只有缓存未命中时才查询数据库。
+    """
+    try:
+        validated_token = AccessToken(token)
+    except TokenError as e:
+        return STATUS_INVALID, {"code": "token_not_valid", "detail": str(e.args[0])}
+    try:
+        validated_token.check_generation()
+    except TokenError as e:
+        return STATUS_INVALID, {"code": "token_revoked", "detail": str(e.args[0])}
+    return STATUS_VALID, validated_token.payload
+
+
+class ValidatedTokenCache:
+    """
+    有界 LRU 缓存，保存已校验通过的令牌声明。条目最多保留 ttl 秒(不超过令牌的 exp)，
+    默认与吊销文件的重新加载间隔相同，之后被吊销或用户吊销全部会话的令牌不会一直命中缓存。
+    只在事件循环线程中访问。
+    """
+
+    def __init__(self, maxsize, ttl=REVOCATION_RELOAD_INTERVAL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, token):
+        entry = self._data.get(token)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[token]
+            return None
+        self._data.move_to_end(token)
+        return payload
+
+    def set(self, token, payload):
+        if self.maxsize <= 0:
+            return
+        self._data[token] = (payload, min(payload["exp"], time.time() + self.ttl))
+        self._data.move_to_end(token)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class Command(BaseCommand):
+    help = "Serves access token verification over a local Unix domain socket"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default="/tmp/cidonly-token.sock")
+        parser.add_argument("--cache-size", type=int, default=10000)
+        parser.add_argument("--mode", type=lambda v: int(v, 8), default=0o660)
+
+    def handle(self, *args, **kwargs):
+        self.cache = ValidatedTokenCache(kwargs["cache_size"])
+        path = kwargs["socket"]
+        if os.path.exists(path):
+            os.unlink(path)
+        try:
+            asyncio.run(self.serve(path, kwargs["mode"]))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def serve(self, path, mode):
+        server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        os.chmod(path, mode)
+        self.stdout.write("Verifying tokens on %s" % path)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        # 一个连接上可以连续发送多个请求帧
+        try:
+            while True:
+                header = await reader.readexactly(REQUEST_HEADER.size)
+                (length,) = REQUEST_HEADER.unpack(header)
+                if length > MAX_TOKEN_SIZE:
+                    writer.write(self.frame(STATUS_BAD_REQUEST, {"code": "token_too_large"}))
+                    break
+                token = (await reader.readexactly(length)).decode("ascii", "replace")
+                writer.write(self.frame(*await self.verify(token)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def verify(self, token):
+        """
+        命中缓存时直接返回；否则在线程池中校验，签名运算和读取吊销文件不阻塞事件循环。
+        """
+        payload = self.cache.get(token)
+        if payload is not None:
+            return STATUS_VALID, payload
+        status, body = await asyncio.get_running_loop().run_in_executor(None, verify_token, token)
+        if status == STATUS_VALID:
+            self.cache.set(token, body)
+        return status, body
+
+    @staticmethod
+    def frame(status, body):
+        data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        return RESPONSE_HEADER.pack(status, len(data)) + data
@@ -0,0 +1,283 @@
+"""
+轻量的 Prometheus 指标。
+
+指标值保存在各个 worker 进程本地；配置了 METRICS_MULTIPROC_DIR 时，每个进程把值写入目录下
+自己的内存映射文件，/metrics 读取目录中所有文件并汇总。目录应在服务启动前清空。
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+METRICS_MULTIPROC_DIR = getattr(settings, "METRICS_MULTIPROC_DIR", None) or os.environ.get(
+    "PROMETHEUS_MULTIPROC_DIR"
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.1)
+
+_INITIAL_FILE_SIZE = 1 << 16
+_USED = struct.Struct("<I")
+_ENTRY_HEADER = struct.Struct("<I")
+_DOUBLE = struct.Struct("<d")
+_pack_double = _DOUBLE.pack_into
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        # 多线程 worker 中 += 不是原子操作，不加锁会丢失计数
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _MmapValue:
+    __slots__ = ("value", "_mmap", "_offset", "_lock")
+
+    def __init__(self, file, offset):
+        self.value = 0.0
+        # mmap.resize 原地扩容，这里持有的映射对象始终有效
+        self._mmap = file.mmap
+        self._offset = offset
+        # 与文件共用一把锁：扩容时不能有正在写入的值
+        self._lock = file.lock
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+            _pack_double(self._mmap, self._offset, self.value)
+
+
+class _MmapFile:
+    """
+    单个进程的指标文件: 4 字节已用长度，随后是 (键长度, 键, 8 字节对齐的 double) 条目。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(fd, _INITIAL_FILE_SIZE)
+        self.mmap = mmap.mmap(fd, _INITIAL_FILE_SIZE)
+        os.close(fd)
+        self.lock = threading.Lock()
+        self.used = _USED.size
+        _USED.pack_into(self.mmap, 0, self.used)
+
+    def allocate(self, key):
+        data = key.encode("utf-8")
+        padded = len(data) + (-(len(data) + _ENTRY_HEADER.size) % 8)
+        size = _ENTRY_HEADER.size + padded + _DOUBLE.size
+        with self.lock:
+            while self.used + size > len(self.mmap):
+                self.mmap.resize(len(self.mmap) * 2)
+            _ENTRY_HEADER.pack_into(self.mmap, self.used, len(data))
+            self.mmap[self.used + _ENTRY_HEADER.size:self.used + _ENTRY_HEADER.size + len(data)] = data
+            offset = self.used + _ENTRY_HEADER.size + padded
+            _DOUBLE.pack_into(self.mmap, offset, 0.0)
+            self.used += size
+            _USED.pack_into(self.mmap, 0, self.used)
+        return offset
+
+
+def read_mmap_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _USED.size:
+        return
+    (used,) = _USED.unpack_from(data, 0)
+    position = _USED.size
+    while position < min(used, len(data)):
+        (length,) = _ENTRY_HEADER.unpack_from(data, position)
+        key = data[position + _ENTRY_HEADER.size:position + _ENTRY_HEADER.size + length].decode("utf-8")
+        padded = length + (-(length + _ENTRY_HEADER.size) % 8)
+        offset = position + _ENTRY_HEADER.size + padded
+        yield key, _DOUBLE.unpack_from(data, offset)[0]
+        position = offset + _DOUBLE.size
+
+
+class _Store:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.values = {}
+        self.file = None
+        self.open()
+
+    def open(self):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.file = _MmapFile(os.path.join(self.directory, "metrics-%d.db" % os.getpid()))
+
+    def get(self, key):
+        with self.lock:
+            value = self.values.get(key)
+            if value is None:
+                if self.file is not None:
+                    value = _MmapValue(self.file, self.file.allocate(key))
+                else:
+                    value = _Value()
+                self.values[key] = value
+            return value
+
+    def reset_after_fork(self):
+        # fork 出的子进程使用自己的文件，已绑定的值重新分配并清零
+        self.lock = threading.Lock()
+        # fork 时其它线程可能正持有值的锁，子进程中换成新锁
+        if self.file is None:
+            for value in self.values.values():
+                value.value = 0.0
+                value._lock = threading.Lock()
+            return
+        self.open()
+        for key, value in self.values.items():
+            value.value = 0.0
+            value._mmap = self.file.mmap
+            value._lock = self.file.lock
+            value._offset = self.file.allocate(key)
+
+    def collect(self):
+        totals = {}
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.db")):
+                for key, value in read_mmap_file(path):
+                    totals[key] = totals.get(key, 0.0) + value
+        else:
+            for key, value in self.values.items():
+                totals[key] = value.value
+        return totals
+
+
+_store = _Store(METRICS_MULTIPROC_DIR)
+os.register_at_fork(after_in_child=_store.reset_after_fork)
+REGISTRY = {}
+
+
+def _key(name, suffix, labels, le=None):
+    return json.dumps([name, suffix, labels, le], separators=(",", ":"))
+
+
+class _Metric:
+    metric_type = None
+    # HELP/TYPE 使用的名称后缀，与样本名称一致
+    family_suffix = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        REGISTRY[name] = self
+
+    def labels(self, *values):
+        """
+        返回绑定了标签值的子指标，热点路径上应缓存返回值。
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError("Incorrect label count for %s" % self.name)
+            child = self._children[values] = self._make_child(
+                [[n, str(v)] for n, v in zip(self.labelnames, values)]
+            )
+        return child
+
+
+class _CounterChild:
+    __slots__ = ("inc",)
+
+    def __init__(self, value):
+        self.inc = value.inc
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+    family_suffix = "_total"
+
+    def _make_child(self, labels):
+        return _CounterChild(_store.get(_key(self.name, "_total", labels)))
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "_counts", "_sum")
+
+    def __init__(self, name, labels, buckets):
+        self.buckets = buckets
+        self._counts = [_store.get(_key(name, "_bucket", labels, le)) for le in buckets + (float("inf"),)]
+        self._sum = _store.get(_key(name, "_sum", labels))
+
+    def observe(self, amount):
+        # 每个桶只记非累计计数，导出时再累加并得到 _count
+        self._counts[bisect_left(self.buckets, amount)].inc()
+        self._sum.inc(amount)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _make_child(self, labels):
+        return _HistogramChild(self.name, labels, self.buckets)
+
+    def observe(self, amount):
+        self.labels().observe(amount)
+
+
+def _format_labels(labels, le=None):
+    pairs = list(labels)
+    if le is not None:
+        pairs.append(["le", "+Inf" if le == float("inf") else repr(le)])
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (n, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in pairs
+    )
+
+
+def generate_latest():
+    """
+    以 Prometheus 文本格式导出所有指标。
+    """
+    samples = {}
+    for key, value in _store.collect().items():
+        name, suffix, labels, le = json.loads(key)
+        samples.setdefault(name, []).append((suffix, labels, le, value))
+
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        family = name + metric.family_suffix
+        lines.append("# HELP %s %s" % (family, metric.documentation))
+        lines.append("# TYPE %s %s" % (family, metric.metric_type))
+        buckets = {}
+        for suffix, labels, le, value in sorted(samples.get(name, ()), key=lambda s: (s[1], s[0])):
+            if suffix == "_bucket":
+                buckets.setdefault(json.dumps(labels), []).append((le, value))
+            else:
+                lines.append("%s%s%s %r" % (name, suffix, _format_labels(labels), value))
+        for labels, counts in buckets.items():
+            cumulative = 0.0
+            for le, value in sorted(counts, key=lambda c: c[0]):
+                cumulative += value
+                lines.append("%s_bucket%s %r" % (name, _format_labels(json.loads(labels), le), cumulative))
+            lines.append("%s_count%s %r" % (name, _format_labels(json.loads(labels)), cumulative))
+    return "\n".join(lines) + "\n"
+
+
+TOKENS_ISSUED = Counter("demo_tokens_issued", "Tokens issued by the login endpoint", ("token_type",))
+AUTH_FAILURES = Counter("demo_auth_failures", "Authentication failures raised by JWTAuthentication", ("code",))
+TOKEN_DECODE_SECONDS = Histogram("demo_token_decode_seconds", "Time spent in TokenBackend.decode")
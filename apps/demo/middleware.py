@@ -0,0 +1,110 @@
+import logging
+import random
+import time
+from uuid import uuid4
+
+from rest_framework.exceptions import APIException
+
+from .authentication import JWTAuthentication
+from .log import request_id_var, timings_var, user_id_var
+from .profiling import PROFILE_HEADER, PROFILE_PARAM, PROFILE_SAMPLE_RATE, RequestProfiler, profile_store
+
+logger = logging.getLogger("demo.request")
+
+
+class RequestContextMiddleware:
+    """
+    为每个请求分配请求 id，收集阶段耗时，并在请求结束时输出一条结构化日志。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get("HTTP_X_REQUEST_ID") or uuid4().hex
+        timings = {}
+        tokens = (
+            request_id_var.set(request_id),
+            user_id_var.set(None),
+            timings_var.set(timings),
+        )
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            response["X-Request-ID"] = request_id
+            timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+            if logger.isEnabledFor(logging.INFO):
+                user = getattr(request, "user", None)
+                logger.info(
+                    "%s %s %s",
+                    request.method,
+                    request.path,
+                    response.status_code,
+                    extra={"user_id": getattr(user, "pk", None), "timings": timings},
+                )
+            return response
+        finally:
+            for var, token in zip((request_id_var, user_id_var, timings_var), tokens):
+                var.reset(token)
+
+
+class ProfilingMiddleware:
+    """
+    员工请求带上 X-Profile 头或 ?_profile 参数时，在分析器下执行视图并把结果写入 profile_store；
+    PROFILE_SAMPLE_RATE 大于 0 时另外按比例随机抽样任意请求。
+    未触发时只多一次请求头查找和一次查询字符串查找。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        if not sampled and not self.requested(request):
+            return self.get_response(request)
+
+        profiler = RequestProfiler()
+        # 身份检查也在分析器下执行，结果中包含 JWTAuthentication 的开销
+        profiler.start()
+        if not sampled and not self.is_staff(request):
+            profiler.stop()
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+
+        user = getattr(request, "user", None)
+        name = profile_store.save(profiler, {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "user_id": getattr(user, "pk", None),
+            "request_id": request_id_var.get(),
+            "sampled": sampled,
+            "started_at": time.time() - profiler.elapsed / 1000,
+        })
+        # 只有员工主动触发时才返回结果名称，随机抽样对客户端不可见
+        if not sampled or (self.requested(request) and self.is_staff(request)):
+            response["X-Profile-ID"] = name
+        return response
+
+    @staticmethod
+    def requested(request):
+        return PROFILE_HEADER in request.META or (
+            PROFILE_PARAM in request.META.get("QUERY_STRING", "") and PROFILE_PARAM in request.GET
+        )
+
+    @staticmethod
+    def is_staff(request):
+        """
+        会话用户或 JWT 用户是员工时才允许按请求触发。
+        """
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return user.is_staff
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        return result is not None and result[0].is_staff
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0002_alter_user_last_login'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='perm_version',
+            field=models.PositiveIntegerField(default=0, help_text='权限版本，权限变化时递增'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:22
+
+import demo.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0004_review_base_related_names'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', demo.models.SoftDeleteUserManager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['deleted_at', 'id'], name='demo_user_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at'], name='demo_user_created'),
+        ),
+    ]
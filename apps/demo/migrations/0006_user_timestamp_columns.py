@@ -0,0 +1,28 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0005_user_soft_delete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='created_at_dt',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='deleted_at_dt',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_login_dt',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# 把 User 的时间字段切换到已回填的 *_dt 列，只修改 state，不改动表结构。
+# 应用前需要先执行 manage.py onlinemigrate demo.User.timestamps。
+
+from django.db import migrations, models
+
+from base.backfill import RequireBackfill
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0001_initial'),
+        ('demo', '0006_user_timestamp_columns'),
+    ]
+
+    operations = [
+        RequireBackfill(
+            'demo.User.timestamps',
+            'demo.User',
+            [
+                ('created_at', 'created_at_dt', None),
+                ('deleted_at', 'deleted_at_dt', None),
+                ('last_login', 'last_login_dt', None),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='demo_user_alive',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='demo_user_created',
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='user',
+                    old_name='created_at',
+                    new_name='legacy_created_at',
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='legacy_created_at',
+                    field=models.CharField(db_column='created_at', max_length=20, null=True),
+                ),
+                migrations.RenameField(
+                    model_name='user',
+                    old_name='created_at_dt',
+                    new_name='created_at',
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='created_at',
+                    field=models.DateTimeField(db_column='created_at_dt', null=True),
+                ),
+                migrations.RenameField(
+                    model_name='user',
+                    old_name='deleted_at',
+                    new_name='legacy_deleted_at',
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='legacy_deleted_at',
+                    field=models.CharField(db_column='deleted_at', max_length=20, null=True),
+                ),
+                migrations.RenameField(
+                    model_name='user',
+                    old_name='deleted_at_dt',
+                    new_name='deleted_at',
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='deleted_at',
+                    field=models.DateTimeField(db_column='deleted_at_dt', null=True),
+                ),
+                migrations.RenameField(
+                    model_name='user',
+                    old_name='last_login',
+                    new_name='legacy_last_login',
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='legacy_last_login',
+                    field=models.CharField(blank=True, db_column='last_login', max_length=50),
+                ),
+                migrations.RenameField(
+                    model_name='user',
+                    old_name='last_login_dt',
+                    new_name='last_login',
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='last_login',
+                    field=models.DateTimeField(blank=True, db_column='last_login_dt', help_text='最后登陆时间', null=True),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['deleted_at', 'id'], name='demo_user_alive'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at'], name='demo_user_created'),
+        ),
+    ]
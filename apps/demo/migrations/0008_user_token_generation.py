@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0007_swap_user_timestamp_reads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_generation',
+            field=models.PositiveIntegerField(default=0, help_text='令牌代数，吊销全部会话时递增'),
+        ),
+    ]
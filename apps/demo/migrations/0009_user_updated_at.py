@@ -0,0 +1,22 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('demo', '0008_user_token_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='最后修改时间', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['deleted_at', 'updated_at'], name='demo_user_updated'),
+        ),
+    ]
@@ -1,12 +1,61 @@
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import AbstractBaseUser, UserManager, AbstractUser
-from django.db import models
-from base.models import ReviewBaseModels
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import F
+from django.utils import timezone
+from base.models import ReviewBaseModels, SoftDeleteQuerySet
 USER_ID_CLAIM = 'user_id'
+# 这些字段变化会影响权限判断，需要让令牌里的权限快照失效
+PERMISSION_STATE_FIELDS = ('is_superuser', 'is_supper', 'is_staff', 'is_active')
+# 只通过 F() 原子递增的计数列，普通保存不写回内存中可能已过期的值
+COUNTER_FIELDS = ('perm_version', 'token_generation')
+# 时间字段 -> 双写的旧字符串字段
+LEGACY_TIMESTAMP_FIELDS = {
+    'created_at': 'legacy_created_at',
+    'deleted_at': 'legacy_deleted_at',
+    'last_login': 'legacy_last_login',
+}
+LEGACY_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# 令牌代数缓存，多进程部署应指向共享缓存(如 redis)，否则其它进程最多在超时后才看到吊销
+TOKEN_GENERATION_CACHE = getattr(settings, 'JWT_TOKEN_GENERATION_CACHE', 'default')
+TOKEN_GENERATION_CACHE_TIMEOUT = getattr(settings, 'JWT_TOKEN_GENERATION_CACHE_TIMEOUT', 60)
+
+
+def format_legacy_datetime(value):
+    return value.strftime(LEGACY_DATETIME_FORMAT) if value is not None else None
+
+
+def token_generation_cache_key(user_id):
+    return 'demo:token_generation:%s' % user_id
+
+
+def get_token_generation(user_id, use_database=True):
+    """
+    读取用户当前的令牌代数，优先使用缓存；用户不存在时返回 None。
+    use_database 为假时只读缓存，缓存未命中也返回 None。
+    """
+    cache = caches[TOKEN_GENERATION_CACHE]
+    key = token_generation_cache_key(user_id)
+    generation = cache.get(key)
+    if generation is None and use_database:
+        # 读主库，副本的复制延迟会让刚吊销的令牌继续有效
+        generation = (
+            User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).values_list('token_generation', flat=True).first()
+        )
+        if generation is None:
+            return None
+        cache.set(key, generation, TOKEN_GENERATION_CACHE_TIMEOUT)
+    return generation
+
+
+class SoftDeleteUserManager(UserManager.from_queryset(SoftDeleteQuerySet)):
+    pass
 
 
 class User(AbstractUser, ReviewBaseModels):
-    objects = UserManager()
+    objects = SoftDeleteUserManager()
     USERNAME_FIELD = 'username'
     email = models.EmailField(blank=True)
     username = models.CharField(max_length=100, help_text='用户名', unique=True)
@@ -15,11 +64,89 @@ class User(AbstractUser, ReviewBaseModels):
     type = models.CharField(max_length=20, default='default', help_text='类型')
     is_supper = models.BooleanField(default=False, help_text='是否管理员')
     is_active = models.BooleanField(default=True, help_text='是否启用')
-    last_login = models.CharField(max_length=50, help_text='最后登陆时间', blank=True)
     last_ip = models.CharField(max_length=50, help_text='最后登陆IP地址', blank=True)
     wx_token = models.CharField(max_length=50, null=True, help_text='用于发送微信消息的token')
+    perm_version = models.PositiveIntegerField(default=0, help_text='权限版本，权限变化时递增')
+    token_generation = models.PositiveIntegerField(default=0, help_text='令牌代数，吊销全部会话时递增')
+    # 条件请求(ETag/Last-Modified)使用；绕过 save() 的批量更新也要写入该字段
+    updated_at = models.DateTimeField(auto_now=True, null=True, help_text='最后修改时间')
+    # 时间已迁移到 *_dt 新列(见 backfills.py)，旧的字符串列继续双写以便回滚
+    created_at = models.DateTimeField(null=True, db_column='created_at_dt')
+    deleted_at = models.DateTimeField(null=True, db_column='deleted_at_dt')
+    last_login = models.DateTimeField(null=True, blank=True, db_column='last_login_dt', help_text='最后登陆时间')
+    legacy_created_at = models.CharField(max_length=20, null=True, db_column='created_at')
+    legacy_deleted_at = models.CharField(max_length=20, null=True, db_column='deleted_at')
+    legacy_last_login = models.CharField(max_length=50, blank=True, db_column='last_login')
     # roles = models.ManyToManyField('Role', db_table='user_role_rel')
 
+    class Meta(AbstractUser.Meta):
+        indexes = ReviewBaseModels.Meta.indexes + [
+            # 列表的 ETag: SELECT MAX(updated_at) WHERE deleted_at IS NULL
+            models.Index(fields=['deleted_at', 'updated_at'], name='demo_user_updated'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_permission_state = instance.permission_state()
+        return instance
+
+    def permission_state(self):
+        # 只读取已加载的字段，避免延迟字段触发查询
+        return tuple(self.__dict__.get(field) for field in PERMISSION_STATE_FIELDS)
+
+    @classmethod
+    def soft_delete_values(cls, now, user=None):
+        values = super().soft_delete_values(now, user)
+        values['legacy_deleted_at'] = format_legacy_datetime(now)
+        values['updated_at'] = now
+        return values
+
+    def sync_legacy_timestamps(self):
+        for field, legacy_field in LEGACY_TIMESTAMP_FIELDS.items():
+            if field in self.__dict__:
+                value = format_legacy_datetime(self.__dict__[field])
+                if value is None and not self._meta.get_field(legacy_field).null:
+                    value = ''
+                setattr(self, legacy_field, value)
+
+    def save(self, *args, **kwargs):
+        loaded_state = getattr(self, '_loaded_permission_state', None)
+        bump_perm_version = loaded_state is not None and loaded_state != self.permission_state()
+        self.sync_legacy_timestamps()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # 已存在的行只写回已加载的普通字段，计数列可能已被信号或 revoke_tokens 并发递增
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS and field.attname not in deferred
+            ]
+        if update_fields is not None:
+            extra_fields = {'updated_at'}
+            extra_fields.update(
+                legacy for field, legacy in LEGACY_TIMESTAMP_FIELDS.items() if field in update_fields
+            )
+            if bump_perm_version:
+                self.perm_version = F('perm_version') + 1
+                extra_fields.add('perm_version')
+            kwargs['update_fields'] = {*update_fields, *extra_fields}
+        super().save(*args, **kwargs)
+        if bump_perm_version:
+            self.refresh_from_db(fields=['perm_version'])
+        self._loaded_permission_state = self.permission_state()
+
+    def revoke_tokens(self):
+        """
+        吊销该用户已签发的全部令牌：只递增令牌代数，耗时与令牌数量无关。
+        """
+        User.objects.filter(pk=self.pk).update(token_generation=F('token_generation') + 1, updated_at=timezone.now())
+        self.refresh_from_db(fields=['token_generation'])
+        caches[TOKEN_GENERATION_CACHE].set(
+            token_generation_cache_key(self.pk), self.token_generation, TOKEN_GENERATION_CACHE_TIMEOUT
+        )
+        return self.token_generation
+
     @staticmethod
     def make_password(plain_password: str) -> str:
         return make_password(plain_password, hasher='pbkdf2_sha256')
@@ -0,0 +1,16 @@
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from .codec import codec
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    使用 demo.codec 解析请求体。
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return codec.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
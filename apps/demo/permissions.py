@@ -1,11 +1,105 @@
-from rest_framework.permissions import BasePermission, IsAuthenticated, SAFE_METHODS
+import logging
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from rest_framework.permissions import BasePermission, DjangoModelPermissions, IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .tokens import PERMISSIONS_CLAIM
+
+# 签发令牌时是否嵌入权限快照
+EMBED_PERMISSION_SNAPSHOT = getattr(settings, "JWT_PERMISSION_SNAPSHOT", False)
+
+logger = logging.getLogger(__name__)
+
 
 class AllowPostPermission(BasePermission):
     def has_permission(self, request, view):
-        print("查看一下method")
-        print(request.method)
+        logger.debug("查看一下method: %s", request.method)
         return request.method == "POST"
 
+
+@lru_cache(maxsize=1)
+def get_permission_ids():
+    """
+    权限名 "app_label.codename" 到权限 id 的映射，每个进程只加载一次。
+    """
+    return {
+        "%s.%s" % (app_label, codename): pk
+        for pk, app_label, codename in Permission.objects.values_list(
+            "pk", "content_type__app_label", "codename"
+        )
+    }
+
+
+def encode_permission_bits(permission_ids):
+    bits = 0
+    for pk in permission_ids:
+        bits |= 1 << pk
+    data = bits.to_bytes((bits.bit_length() + 7) // 8 or 1, "big")
+    return urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def decode_permission_bits(value):
+    data = urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    return int.from_bytes(data, "big")
+
+
+def build_permission_snapshot(user):
+    """
+    生成权限快照: 权限版本、是否超级用户、以及已授予权限 id 的位图。
+    """
+    snapshot = {"v": user.perm_version, "su": bool(user.is_active and user.is_superuser)}
+    if not snapshot["su"]:
+        permission_ids = get_permission_ids()
+        snapshot["b"] = encode_permission_bits(
+            permission_ids[name] for name in user.get_all_permissions() if name in permission_ids
+        )
+    return snapshot
+
+
+class SnapshotModelPermissions(DjangoModelPermissions):
+    """
+    优先使用令牌中的权限快照在内存中判断模型权限；
+    没有快照、快照版本过期或遇到未知权限时回退到 DjangoModelPermissions。
+
+    启用方法：设置 JWT_PERMISSION_SNAPSHOT = True，让登录签发的令牌带上快照，
+    再在视图的 permission_classes 中用它代替 DjangoModelPermissions。
+    """
+
+    def has_permission(self, request, view):
+        if getattr(view, "_ignore_model_permissions", False):
+            return True
+        if not request.user or not request.user.is_authenticated:
+            return False
+
+        snapshot = self.get_snapshot(request)
+        if snapshot is None:
+            return super().has_permission(request, view)
+        if snapshot["su"]:
+            return True
+
+        queryset = self._queryset(view)
+        perms = self.get_required_permissions(request.method, queryset.model)
+        permission_ids = get_permission_ids()
+        if any(name not in permission_ids for name in perms):
+            return super().has_permission(request, view)
+
+        bits = decode_permission_bits(snapshot.get("b", ""))
+        return all(bits >> permission_ids[name] & 1 for name in perms)
+
+    @staticmethod
+    def get_snapshot(request):
+        token = request.auth
+        if token is None or not hasattr(token, "get"):
+            return None
+        snapshot = token.get(PERMISSIONS_CLAIM)
+        if not isinstance(snapshot, dict):
+            return None
+        # JWTAuthentication 已经加载了用户，版本比较不需要额外查询
+        if snapshot.get("v") != getattr(request.user, "perm_version", None):
+            return None
+        return snapshot
@@ -0,0 +1,181 @@
+"""
+按需的单请求性能分析。
+
+员工请求带上 X-Profile 头或 ?_profile 参数时(或按 PROFILE_SAMPLE_RATE 随机抽样)，视图在 cProfile 下执行，
+同时记录每条 SQL 的耗时。结果写入 PROFILE_DIR，按时间滚动，最多保留 PROFILE_MAX_FILES 份：
+<name>.prof 是 pstats 格式，可用 snakeviz 等工具打开；<name>.json 是请求信息、耗时最多的函数和 SQL 列表。
+"""
+import cProfile
+import os
+import pstats
+import re
+import time
+from contextlib import ExitStack
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connections
+
+from .codec import codec
+
+PROFILE_DIR = str(getattr(settings, "PROFILE_DIR", "profiles"))
+PROFILE_MAX_FILES = getattr(settings, "PROFILE_MAX_FILES", 50)
+PROFILE_SAMPLE_RATE = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_HEADER = "HTTP_X_PROFILE"
+PROFILE_PARAM = "_profile"
+# 每份分析结果中保留的函数数和 SQL 条数
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_MAX_QUERIES = 1000
+
+PROFILE_NAME = re.compile(r"^\d{20}-[0-9a-f]{8}$")
+PROFILE_KINDS = ("prof", "json")
+
+
+class QueryRecorder:
+    """
+    记录 SQL 模板、所在连接和耗时，不记录参数(可能含密码哈希等敏感数据)。
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.total += elapsed
+            if len(self.queries) < PROFILE_MAX_QUERIES:
+                self.queries.append({
+                    "alias": context["connection"].alias,
+                    "sql": sql,
+                    "many": many,
+                    "ms": round(elapsed, 3),
+                })
+
+
+class RequestProfiler:
+    """
+    在当前线程上启用 cProfile，并给所有数据库连接挂上 QueryRecorder。
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.recorder = QueryRecorder()
+        self.stack = ExitStack()
+        self.started = None
+        self.elapsed = None
+
+    def start(self):
+        for alias in connections:
+            self.stack.enter_context(connections[alias].execute_wrapper(self.recorder))
+        self.started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.elapsed = (time.perf_counter() - self.started) * 1000
+        self.stack.close()
+
+    def top_functions(self, limit=PROFILE_TOP_FUNCTIONS):
+        stats = pstats.Stats(self.profile).sort_stats(pstats.SortKey.CUMULATIVE)
+        functions = []
+        for func in stats.fcn_list[:limit]:
+            primitive_calls, calls, own_time, cumulative_time, _ = stats.stats[func]
+            functions.append({
+                "function": pstats.func_std_string(func),
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "own_ms": round(own_time * 1000, 3),
+                "cumulative_ms": round(cumulative_time * 1000, 3),
+            })
+        return functions
+
+
+class ProfileStore:
+    """
+    目录中的分析结果环，文件名以纳秒时间戳开头，按名称排序即按时间排序。
+    先写 .prof 再写 .json，列表只看 .json，因此不会列出写了一半的结果。
+    """
+
+    def __init__(self, path=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.path = path
+        self.max_files = max_files
+
+    def save(self, profiler, meta):
+        os.makedirs(self.path, exist_ok=True)
+        name = "%020d-%s" % (time.time_ns(), uuid4().hex[:8])
+        self.write(name, "prof", lambda temp: profiler.profile.dump_stats(temp))
+        summary = dict(
+            meta,
+            name=name,
+            duration_ms=round(profiler.elapsed, 3),
+            query_count=profiler.recorder.count,
+            query_ms=round(profiler.recorder.total, 3),
+            functions=profiler.top_functions(),
+            queries=profiler.recorder.queries,
+        )
+        self.write(name, "json", lambda temp: self.write_bytes(temp, codec.dumps(summary)))
+        self.prune()
+        return name
+
+    def write(self, name, kind, writer):
+        # 写临时文件后改名，读取方不会看到不完整的文件
+        path = os.path.join(self.path, "%s.%s" % (name, kind))
+        temp = path + ".tmp"
+        writer(temp)
+        os.replace(temp, path)
+
+    @staticmethod
+    def write_bytes(path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def names(self):
+        try:
+            files = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            filename[:-len(".json")] for filename in files
+            if filename.endswith(".json") and PROFILE_NAME.match(filename[:-len(".json")])
+        )
+
+    def prune(self):
+        names = self.names()
+        for name in names[:max(0, len(names) - self.max_files)]:
+            for kind in PROFILE_KINDS:
+                try:
+                    os.remove(os.path.join(self.path, "%s.%s" % (name, kind)))
+                except FileNotFoundError:
+                    # 其它进程已经删除
+                    pass
+
+    def list(self):
+        """
+        按时间倒序返回各分析结果的请求信息，不含函数和 SQL 明细。
+        """
+        results = []
+        for name in reversed(self.names()):
+            try:
+                with open(os.path.join(self.path, name + ".json"), "rb") as f:
+                    summary = codec.loads(f.read())
+            except FileNotFoundError:
+                continue
+            summary.pop("functions", None)
+            summary.pop("queries", None)
+            results.append(summary)
+        return results
+
+    def file_path(self, name, kind):
+        if not PROFILE_NAME.match(name) or kind not in PROFILE_KINDS:
+            return None
+        path = os.path.join(self.path, "%s.%s" % (name, kind))
+        return path if os.path.exists(path) else None
+
+
+profile_store = ProfileStore()
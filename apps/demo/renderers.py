@@ -0,0 +1,17 @@
+from rest_framework import renderers
+
+from .codec import codec
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    使用 demo.codec 输出紧凑、键排序的 JSON；客户端要求缩进时(如 ?indent=) 仍交给 DRF 处理。
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # 与 DRF 一样转义 U+2028/U+2029，输出可以安全嵌入 JavaScript
+        return codec.dumps(data).replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -1,17 +1,56 @@
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, Permission
 
+from base.serializers import SerializerColumnsMixin, SparseFieldsMixin
 from .models import User
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions, serializers
-from .tokens import RefreshToken
+from .metrics import TOKENS_ISSUED
+from .permissions import EMBED_PERMISSION_SNAPSHOT, build_permission_snapshot
+from .tokens import PERMISSIONS_CLAIM, SLIDING_TOKEN_REFRESH_EXP_CLAIM, RefreshToken, SlidingToken
 from django.contrib.auth.models import update_last_login
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+class UserSummarySerializer(SerializerColumnsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = '__all__'
+        fields = ('id', 'username', 'nickname')
+
+
+class GroupSerializer(SerializerColumnsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Group
+        fields = ('id', 'name')
+
+
+class PermissionSerializer(SerializerColumnsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Permission
+        fields = ('id', 'codename', 'name')
+
+
+class UserSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
+    """
+    支持 ?fields=id,username 只返回部分字段，?expand=created_by,groups 返回关系的嵌套表示。
+    """
+    id = serializers.ReadOnlyField()
+    # 没有分组和权限的接口，无法生成超链接，使用主键
+    groups = serializers.PrimaryKeyRelatedField(many=True, required=False, queryset=Group.objects.all())
+    user_permissions = serializers.PrimaryKeyRelatedField(many=True, required=False, queryset=Permission.objects.all())
+
+    class Meta:
+        model = User
+        # 旧的字符串时间列只用于回滚双写，不对外暴露
+        exclude = ('legacy_created_at', 'legacy_deleted_at', 'legacy_last_login')
+        read_only_fields = ('token_generation',)
+        extra_kwargs = {'password': {'write_only': True}}
+        expandable_fields = {
+            'created_by': (UserSummarySerializer, {}),
+            'deleted_by': (UserSummarySerializer, {}),
+            'groups': (GroupSerializer, {'many': True}),
+            'user_permissions': (PermissionSerializer, {'many': True}),
+        }
 
     def validate_password(self, value):
         value = make_password(value, hasher='pbkdf2_sha256')
@@ -26,13 +65,23 @@ class PasswordField(serializers.CharField):
         super().__init__(**kwargs)
 
 
-class TokenObtainPairSerializer(serializers.Serializer):
-    token_class = RefreshToken
+_refresh_issued = TOKENS_ISSUED.labels("refresh")
+_access_issued = TOKENS_ISSUED.labels("access")
+_sliding_issued = TOKENS_ISSUED.labels("sliding")
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    """
+    校验用户名和密码，子类决定签发哪种令牌。
+    """
+    token_class = None
     user = None
     password = PasswordField()
     username_field = get_user_model().USERNAME_FIELD
-    refresh = serializers.CharField(read_only=True)
-    access = serializers.CharField(read_only=True)
+
+    default_error_messages = {
+        "no_active_account": _("No active account found with the given credentials")
+    }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -49,18 +98,87 @@ class TokenObtainPairSerializer(serializers.Serializer):
             pass
 
         self.user = authenticate(**authenticate_kwargs)
-        if self.user is None or not self.user.is_active:
+        # ModelBackend 通过 _default_manager 查找用户，不排除软删除的用户
+        if self.user is None or not self.user.is_active or getattr(self.user, "is_deleted", False):
             raise exceptions.AuthenticationFailed(
                 self.error_messages["no_active_account"],
                 "no_active_account",
             )
+        return {}
 
-        refresh = self.get_token(self.user)
-        return {
-            "refresh": str(refresh),
-            "access": str(refresh.access_token)
-        }
+    embed_permission_snapshot = EMBED_PERMISSION_SNAPSHOT
 
     @classmethod
     def get_token(cls, user):
-        return cls.token_class.for_user(user)
+        token = cls.token_class.for_user(user)
+        if cls.embed_permission_snapshot:
+            token[PERMISSIONS_CLAIM] = build_permission_snapshot(user)
+        return token
+
+
+class TokenObtainPairSerializer(TokenObtainSerializer):
+    token_class = RefreshToken
+    refresh = serializers.CharField(read_only=True)
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+
+        refresh = self.get_token(self.user)
+        data["refresh"] = str(refresh)
+        data["access"] = str(refresh.access_token)
+        _refresh_issued.inc()
+        _access_issued.inc()
+        return data
+
+
+class TokenObtainSlidingSerializer(TokenObtainSerializer):
+    """
+    登录并签发单个滑动令牌，客户端在 refresh_exp 之前可以反复续期，不需要刷新/访问令牌对。
+    """
+    token_class = SlidingToken
+    token = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data["token"] = str(self.get_token(self.user))
+        _sliding_issued.inc()
+        return data
+
+
+class TokenRefreshSlidingSerializer(serializers.Serializer):
+    """
+    滑动令牌续期：校验签名和 refresh_exp 后用新的 exp/iat 重新签名，不查询数据库。
+    当前 exp 已过期但 refresh_exp 未过期的令牌也可以续期。
+    令牌代数只读缓存：缓存过期后漏掉的吊销会在续期后的令牌用于认证时被拒绝(代数声明不变)。
+    """
+    token = serializers.CharField()
+    token_class = SlidingToken
+
+    def validate(self, attrs):
+        token = self.token_class(attrs["token"], verify_exp=False)
+
+        # Check that the timestamp in the "refresh_exp" claim has not passed
+        token.check_exp(SLIDING_TOKEN_REFRESH_EXP_CLAIM)
+        token.check_generation(use_database=False)
+
+        # Update the "exp" and "iat" claims
+        token.set_exp()
+        token.set_iat()
+        _sliding_issued.inc()
+        return {"token": str(token)}
+
+
+BATCH_VERIFY_MAX_TOKENS = 1000
+
+
+class TokenBatchVerifySerializer(serializers.Serializer):
+    """
+    批量校验令牌，供网关/边车一次请求校验多个令牌。
+    """
+    tokens = serializers.ListField(
+        child=serializers.CharField(trim_whitespace=True),
+        allow_empty=False,
+        max_length=BATCH_VERIFY_MAX_TOKENS,
+    )
+    stream = serializers.BooleanField(default=False, required=False)
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import Group
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+from django.utils import timezone
+
+from .models import User
+
+CHANGED_ACTIONS = {"post_add", "post_remove", "post_clear"}
+
+
+def bump_perm_version(user_ids):
+    if user_ids:
+        User.objects.filter(pk__in=user_ids).update(perm_version=F("perm_version") + 1, updated_at=timezone.now())
+
+
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    用户的组或直接权限变化时递增权限版本。
+    """
+    if action not in CHANGED_ACTIONS:
+        return
+    if not reverse:
+        bump_perm_version([instance.pk])
+    elif action == "post_clear":
+        # 反向 clear 时 pk_set 为空，无法得知受影响的用户
+        User.objects.update(perm_version=F("perm_version") + 1, updated_at=timezone.now())
+    else:
+        bump_perm_version(pk_set)
+
+
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    组的权限变化时，递增该组所有成员的权限版本。
+    """
+    if action not in CHANGED_ACTIONS:
+        return
+    if not reverse:
+        groups = [instance.pk]
+    elif action == "post_clear":
+        User.objects.update(perm_version=F("perm_version") + 1, updated_at=timezone.now())
+        return
+    else:
+        groups = pk_set
+    User.objects.filter(groups__in=groups).update(perm_version=F("perm_version") + 1, updated_at=timezone.now())
+
+
+def connect():
+    m2m_changed.connect(user_permissions_changed, sender=User.groups.through)
+    m2m_changed.connect(user_permissions_changed, sender=User.user_permissions.through)
+    m2m_changed.connect(group_permissions_changed, sender=Group.permissions.through)
@@ -1,12 +1,14 @@
 from .backends import TokenBackend
 from django.conf import settings
+# 默认使用 HS256 + SECRET_KEY；非对称算法(RS*/ES*/EdDSA)配置 PEM 格式的私钥，公钥可省略
 token_backend = TokenBackend(
-    "HS256",
-    settings.SECRET_KEY,
-    "",
+    getattr(settings, "JWT_ALGORITHM", "HS256"),
+    getattr(settings, "JWT_SIGNING_KEY", settings.SECRET_KEY),
+    getattr(settings, "JWT_VERIFYING_KEY", ""),
     None,
     None,
     None,
     0,
     None,
+    key_id=getattr(settings, "JWT_KEY_ID", None),
 )
@@ -1,3 +1,848 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from jwt import algorithms
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from token_blacklist.models import OutstandingToken
+
+from . import authentication, metrics, middleware, permissions, serializers, views, webhooks
+from .authentication import JWTAuthentication, NegativeTokenCache
+from .backends import TokenBackend
+from .exceptions import AuthenticationFailed, InvalidToken, TokenBackendError, TokenError
+from .log import make_queue_handler
+from .management.commands import generatedata, loadtest, runtokenverifier
+from .metrics import TOKEN_DECODE_SECONDS, TOKENS_ISSUED, generate_latest
+from .models import TOKEN_GENERATION_CACHE, User, token_generation_cache_key
+from .permissions import SnapshotModelPermissions, build_permission_snapshot, get_permission_ids
+from .profiling import ProfileStore
+from .state import token_backend
+from .tokens import PERMISSIONS_CLAIM, SLIDING_TOKEN_REFRESH_EXP_CLAIM, AccessToken, RefreshToken, SlidingToken, Token, compact_payload, expand_payload
+from .webhooks import STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING, WebhookQueue
+
+if algorithms.has_crypto:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import (
+        Encoding, NoEncryption, PrivateFormat, PublicFormat,
+    )
+
+
+@skipUnless(algorithms.has_crypto, "cryptography is not installed")
+class EdDSATokenBackendTests(SimpleTestCase):
+    payload = {"token_type": "access", "user_id": 1, "jti": "abc"}
+
+    def setUp(self):
+        private_key = Ed25519PrivateKey.generate()
+        self.private_pem = private_key.private_bytes(
+            Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()
+        ).decode()
+        self.public_pem = private_key.public_key().public_bytes(
+            Encoding.PEM, PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+    def test_round_trip(self):
+        backend = TokenBackend("EdDSA", self.private_pem, self.public_pem)
+        token = backend.encode(self.payload)
+        self.assertIsNone(backend.precheck(token))
+        self.assertEqual(backend.decode(token), self.payload)
+
+    def test_verify_with_public_key_only(self):
+        token = TokenBackend("EdDSA", self.private_pem).encode(self.payload)
+        verifier = TokenBackend("EdDSA", None, self.public_pem)
+        self.assertEqual(verifier.decode(token), self.payload)
+
+    def test_tampered_token_is_rejected(self):
+        backend = TokenBackend("EdDSA", self.private_pem)
+        header, payload, signature = backend.encode(self.payload).split(".")
+        other = TokenBackend("EdDSA", self.private_pem).encode(dict(self.payload, user_id=2))
+        with self.assertRaises(TokenBackendError):
+            backend.decode(".".join((header, other.split(".")[1], signature)))
+
+    def test_other_key_is_rejected(self):
+        token = TokenBackend("EdDSA", self.private_pem).encode(self.payload)
+        other_pem = Ed25519PrivateKey.generate().private_bytes(
+            Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()
+        ).decode()
+        with self.assertRaises(TokenBackendError):
+            TokenBackend("EdDSA", other_pem).decode(token)
+
+    def test_hs256_token_is_rejected(self):
+        token = TokenBackend("HS256", "secret").encode(self.payload)
+        backend = TokenBackend("EdDSA", self.private_pem)
+        self.assertIsNotNone(backend.precheck(token))
+        with self.assertRaises(TokenBackendError):
+            backend.decode(token)
+
+    def test_jwks(self):
+        backend = TokenBackend("EdDSA", self.private_pem, key_id="k1")
+        (jwk,) = backend.get_jwks()["keys"]
+        self.assertEqual((jwk["kty"], jwk["crv"], jwk["alg"], jwk["kid"]), ("OKP", "Ed25519", "EdDSA", "k1"))
+        self.assertNotIn("d", jwk)
+        verifying_key = algorithms.OKPAlgorithm.from_jwk(jwk)
+        token = backend.encode(self.payload)
+        self.assertEqual(TokenBackend("EdDSA", None, verifying_key).decode(token), self.payload)
+
+
+class TokenVerifyWithoutDatabaseTests(SimpleTestCase):
+    """
+    SimpleTestCase 禁止数据库查询，令牌校验必须只依赖签名、声明和吊销文件。
+    """
+
+    def setUp(self):
+        caches[TOKEN_GENERATION_CACHE].clear()
+
+    def test_access_token(self):
+        token = str(AccessToken.for_user(User(id=1, token_generation=3)))
+        self.assertEqual(AccessToken(token)["user_id"], 1)
+
+    def test_sliding_token(self):
+        token = str(SlidingToken.for_user(User(id=1)))
+        self.assertEqual(SlidingToken(token)["user_id"], 1)
+
+    def test_get_validated_token(self):
+        token = str(AccessToken.for_user(User(id=1)))
+        self.assertEqual(JWTAuthentication().get_validated_token(token)["user_id"], 1)
+
+
+class TokenGenerationTests(TestCase):
+    def test_revoked_generation_is_rejected_by_get_user(self):
+        user = User.objects.create_user(username="gen", password="x")
+        authentication = JWTAuthentication()
+        validated = authentication.get_validated_token(str(AccessToken.for_user(user)))
+        self.assertEqual(authentication.get_user(validated), user)
+
+        user.revoke_tokens()
+        with self.assertRaises(AuthenticationFailed) as cm:
+            authentication.get_user(validated)
+        self.assertEqual(cm.exception.detail["code"], "token_revoked")
+        fresh = authentication.get_validated_token(str(AccessToken.for_user(user)))
+        self.assertEqual(authentication.get_user(fresh), user)
+
+
+def verifier_exchange(command, tokens):
+    async def run(path):
+        server = await asyncio.start_unix_server(command.handle_connection, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            results = []
+            for token in tokens:
+                data = token.encode("ascii")
+                writer.write(runtokenverifier.REQUEST_HEADER.pack(len(data)) + data)
+                await writer.drain()
+                header = await reader.readexactly(runtokenverifier.RESPONSE_HEADER.size)
+                status, length = runtokenverifier.RESPONSE_HEADER.unpack(header)
+                results.append((status, json.loads(await reader.readexactly(length))))
+            writer.close()
+            await writer.wait_closed()
+            return results
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(run(os.path.join(directory, "verifier.sock")))
+
+
+class GatewayRevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="gateway", password="x")
+        self.access = str(AccessToken.for_user(self.user))
+        self.sliding = str(SlidingToken.for_user(self.user))
+        self.addCleanup(caches[TOKEN_GENERATION_CACHE].delete, token_generation_cache_key(self.user.pk))
+
+    def test_batch_verify_rejects_revoked_tokens(self):
+        client = APIClient()
+        response = client.post("/demo/verify/", {"tokens": [self.access, self.sliding]}, format="json")
+        self.assertEqual([r["valid"] for r in response.json()["results"]], [True, True])
+
+        self.user.revoke_tokens()
+        response = client.post("/demo/verify/", {"tokens": [self.access, self.sliding]}, format="json")
+        for result in response.json()["results"]:
+            self.assertEqual(
+                (result["valid"], result["code"], result["detail"]),
+                (False, "token_revoked", "Token has been revoked"),
+            )
+
+    def test_socket_daemon_rejects_revoked_tokens(self):
+        self.user.revoke_tokens()
+        command = runtokenverifier.Command()
+        command.cache = runtokenverifier.ValidatedTokenCache(100)
+        fresh = str(AccessToken.for_user(self.user))
+
+        # 执行器线程只读缓存中的代数，看不到本测试事务里的用户行
+        (revoked, valid) = verifier_exchange(command, [self.access, fresh])
+        self.assertEqual(revoked, (runtokenverifier.STATUS_INVALID, {"code": "token_revoked", "detail": "Token has been revoked"}))
+        self.assertEqual(valid[0], runtokenverifier.STATUS_VALID)
+        self.assertNotIn(self.access, command.cache._data)
+
+
+class TokenVerifierSocketTests(SimpleTestCase):
+    def setUp(self):
+        # 代数命中缓存，校验不访问数据库
+        caches[TOKEN_GENERATION_CACHE].set(token_generation_cache_key(7), 0)
+        self.addCleanup(caches[TOKEN_GENERATION_CACHE].delete, token_generation_cache_key(7))
+
+    def test_round_trip(self):
+        command = runtokenverifier.Command()
+        command.cache = runtokenverifier.ValidatedTokenCache(100)
+        token = str(AccessToken.for_user(User(id=7)))
+
+        (valid, cached, invalid) = verifier_exchange(command, [token, token, "not-a-token"])
+        self.assertEqual(valid, (runtokenverifier.STATUS_VALID, AccessToken(token).payload))
+        self.assertEqual(cached, valid)
+        self.assertEqual(invalid[0], runtokenverifier.STATUS_INVALID)
+        self.assertEqual(invalid[1]["code"], "token_not_valid")
+
+        # 缓存条目不超过吊销文件的重新加载间隔
+        _, expires_at = command.cache._data[token]
+        self.assertLessEqual(expires_at, time.time() + runtokenverifier.REVOCATION_RELOAD_INTERVAL)
+
+
+class TokenBatchVerifyTests(SimpleTestCase):
+    url = "/demo/verify/"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.access = str(AccessToken.for_user(User(id=5)))
+        self.refresh = str(RefreshToken.for_user(User(id=5)))
+        caches[TOKEN_GENERATION_CACHE].set(token_generation_cache_key(5), 0)
+        self.addCleanup(caches[TOKEN_GENERATION_CACHE].delete, token_generation_cache_key(5))
+
+    def test_results_keep_request_order_and_verify_duplicates_once(self):
+        tokens = [self.access, "not-a-token", self.access, self.refresh]
+        with mock.patch.object(
+            JWTAuthentication, "get_validated_token", autospec=True,
+            side_effect=JWTAuthentication.get_validated_token,
+        ) as get_validated_token:
+            response = self.client.post(self.url, {"tokens": tokens}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_validated_token.call_count, 3)
+
+        valid, malformed, duplicate, wrong_type = response.json()["results"]
+        self.assertTrue(valid["valid"])
+        self.assertEqual(valid["claims"]["user_id"], 5)
+        self.assertEqual(duplicate, valid)
+        self.assertEqual(
+            (malformed["valid"], malformed["code"], malformed["detail"]),
+            (False, "token_not_valid", "Token is malformed"),
+        )
+        self.assertEqual(
+            (wrong_type["valid"], wrong_type["code"], wrong_type["detail"]),
+            (False, "token_not_valid", "Token has wrong type"),
+        )
+
+    def test_stream_returns_one_ndjson_line_per_distinct_token(self):
+        tokens = [self.access, "not-a-token", self.access]
+        response = self.client.post(self.url, {"tokens": tokens, "stream": True}, format="json")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(lines), 2)
+        by_indexes = {tuple(line["indexes"]): line for line in lines}
+        self.assertTrue(by_indexes[(0, 2)]["valid"])
+        self.assertEqual(by_indexes[(1,)]["detail"], "Token is malformed")
+
+    def test_empty_batch_is_rejected(self):
+        response = self.client.post(self.url, {"tokens": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CompactClaimsTests(SimpleTestCase):
+    def test_payload_round_trip(self):
+        payload = {"token_type": "refresh", "user_id": 5, "perms": "x", "gen": 2, "jti": "j", "exp": 1}
+        compact = compact_payload(payload)
+        self.assertEqual(compact, {"t": "r", "uid": 5, "p": "x", "g": 2, "jti": "j", "exp": 1})
+        self.assertEqual(expand_payload(compact), payload)
+        # 标准格式的载荷原样返回
+        self.assertIs(expand_payload(payload), payload)
+
+    def test_compact_token_is_encoded_short_and_verified_expanded(self):
+        with mock.patch.object(Token, "compact_claims", True):
+            token = str(AccessToken.for_user(User(id=5)))
+            verified = AccessToken(token)
+        raw = token_backend.decode(token)
+        self.assertEqual((raw["t"], raw["uid"]), ("a", 5))
+        self.assertNotIn("token_type", raw)
+        self.assertEqual(len(raw["jti"]), 22)
+        self.assertEqual((verified["token_type"], verified["user_id"]), ("access", 5))
+
+    def test_both_formats_are_accepted(self):
+        standard = str(AccessToken.for_user(User(id=5)))
+        with mock.patch.object(Token, "compact_claims", True):
+            compact = str(AccessToken.for_user(User(id=5)))
+            self.assertEqual(AccessToken(standard)["user_id"], 5)
+        self.assertEqual(AccessToken(compact)["user_id"], 5)
+
+    def test_access_token_copies_only_whitelisted_claims_in_compact_mode(self):
+        refresh = RefreshToken.for_user(User(id=5))
+        refresh["custom"] = "value"
+        self.assertEqual(refresh.access_token["custom"], "value")
+        with mock.patch.object(Token, "compact_claims", True):
+            access = refresh.access_token
+        self.assertNotIn("custom", access)
+        self.assertEqual((access["user_id"], access["gen"]), (5, 0))
+
+
+class UserCounterFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="counter", password="x")
+        # 另一个请求中加载的、之后会变旧的实例
+        self.stale = User.objects.get(pk=self.user.pk)
+
+    def stored(self, field):
+        return User.objects.values_list(field, flat=True).get(pk=self.user.pk)
+
+    def test_save_keeps_concurrent_perm_version_bump(self):
+        self.user.groups.add(Group.objects.create(name="staff"))
+        self.assertEqual(self.stored("perm_version"), 1)
+        self.stale.nickname = "renamed"
+        self.stale.save()
+        self.assertEqual(self.stored("perm_version"), 1)
+        self.assertEqual(self.stored("nickname"), "renamed")
+
+    def test_permission_change_increments_stored_version(self):
+        self.user.groups.add(Group.objects.create(name="staff"))
+        self.stale.is_staff = True
+        self.stale.save()
+        self.assertEqual(self.stored("perm_version"), 2)
+        self.assertEqual(self.stale.perm_version, 2)
+
+    def test_save_keeps_revoked_token_generation(self):
+        self.user.revoke_tokens()
+        self.stale.nickname = "renamed"
+        self.stale.save()
+        self.assertEqual(self.stored("token_generation"), 1)
+
+
+class QueueLogHandlerTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = make_queue_handler(stream=self.stream)
+        self.addCleanup(self.handler.stop_listener)
+        self.logger = logging.getLogger("demo.tests.log")
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def lines(self):
+        self.handler.stop_listener()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_exception_traceback_is_written(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.exception("failed %s", "here")
+        [line] = self.lines()
+        self.assertEqual(line["message"], "failed here")
+        self.assertIn("Traceback", line["exc_info"])
+        self.assertIn("ValueError: boom", line["exc_info"])
+
+    def test_listener_starts_lazily_per_process(self):
+        self.assertIsNone(self.handler.listener)
+        self.logger.warning("parent")
+        parent_queue = self.handler.queue
+        self.addCleanup(self.handler.listener.stop)
+        # 模拟 fork 后的子进程：父进程的线程不存在，换用新的队列重新启动
+        with mock.patch("demo.log.os.getpid", return_value=os.getpid() + 1):
+            self.logger.warning("child")
+            self.assertIsNot(self.handler.queue, parent_queue)
+            messages = [line["message"] for line in self.lines()]
+        self.assertIn("child", messages)
+
+
+class MetricsExpositionTests(SimpleTestCase):
+    def test_family_names_match_samples(self):
+        TOKENS_ISSUED.labels("access").inc()
+        TOKEN_DECODE_SECONDS.observe(0.001)
+        lines = generate_latest().splitlines()
+        self.assertIn("# HELP demo_tokens_issued_total Tokens issued by the login endpoint", lines)
+        self.assertIn("# TYPE demo_tokens_issued_total counter", lines)
+        self.assertTrue(any(line.startswith('demo_tokens_issued_total{token_type="access"} ') for line in lines))
+        self.assertIn("# TYPE demo_token_decode_seconds histogram", lines)
+
+    def test_concurrent_increments_are_not_lost(self):
+        class YieldingFloat(float):
+            # 读出旧值后让出 GIL，使未加锁的 += 必然交错
+            def __add__(self, other):
+                time.sleep(0)
+                return YieldingFloat(float(self) + other)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for store in (metrics._Store(), metrics._Store(directory.name)):
+            value = store.get("counter")
+            value.value = YieldingFloat(0)
+
+            def work():
+                for _ in range(200):
+                    value.inc()
+
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(value.value, 1600)
+            self.assertEqual(store.collect()["counter"], 1600)
+
+
+class NegativeTokenCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = mock.patch.object(authentication, "negative_token_cache", NegativeTokenCache(10, 30)).start()
+        self.decode = mock.patch.object(token_backend, "decode", wraps=token_backend.decode).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def bad_signature_token(self):
+        token = str(AccessToken.for_user(User(id=1)))
+        header, payload, signature = token.split(".")
+        return "%s.%s.%s" % (header, payload, signature[::-1])
+
+    def test_failed_token_is_rejected_from_cache(self):
+        token = self.bad_signature_token()
+        with self.assertRaises(InvalidToken) as first:
+            JWTAuthentication().get_validated_token(token)
+        calls = self.decode.call_count
+        self.assertGreater(calls, 0)
+
+        with self.assertRaises(InvalidToken) as second:
+            JWTAuthentication().get_validated_token(token)
+        # 第二次不再做签名校验，返回同样的错误
+        self.assertEqual(self.decode.call_count, calls)
+        self.assertEqual(second.exception.detail, first.exception.detail)
+
+    def test_malformed_token_skips_verification(self):
+        for token in ("garbage", "a.b", "é.b.c", "e30.e30.sig", "x" * 10000):
+            with self.assertRaises(InvalidToken):
+                JWTAuthentication().get_validated_token(token)
+        self.decode.assert_not_called()
+        # 结构检查失败的令牌不占用缓存
+        self.assertEqual(len(self.cache._data), 0)
+
+    def test_entries_expire(self):
+        key = NegativeTokenCache.key("token")
+        error = InvalidToken("bad")
+        with mock.patch.object(authentication.time, "monotonic", return_value=100.0):
+            self.cache.set(key, error)
+            self.assertIs(self.cache.get(key), error)
+        with mock.patch.object(authentication.time, "monotonic", return_value=130.0):
+            self.assertIsNone(self.cache.get(key))
+
+    def test_oldest_entry_is_evicted(self):
+        cache = NegativeTokenCache(2, 30)
+        keys = [NegativeTokenCache.key("token%d" % i) for i in range(3)]
+        for key in keys:
+            cache.set(key, InvalidToken("bad"))
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        disabled = NegativeTokenCache(0, 30)
+        disabled.set(keys[0], InvalidToken("bad"))
+        self.assertIsNone(disabled.get(keys[0]))
+
+
+class UserConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="etag", password="x")
+        self.other = User.objects.create_user(username="other", password="x")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        etag = self.client.get("/demo/user/")["ETag"]
+        with mock.patch.object(serializers.UserSerializer, "to_representation", side_effect=AssertionError):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/demo/user/", HTTP_IF_NONE_MATCH=etag)
+        # 命中时只做一次聚合查询，不序列化
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response["ETag"], etag)
+
+        # 不同的查询参数是不同的表示
+        self.assertEqual(self.client.get("/demo/user/?page=1", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.other.nickname = "changed"
+        self.other.save(update_fields=["nickname"])
+        response = self.client.get("/demo/user/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_not_modified(self):
+        url = "/demo/user/%d/" % self.other.pk
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.other.revoke_tokens()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_expanded_relations_are_not_conditional(self):
+        # 分组改名不更新用户的 updated_at，带 ?expand= 的响应不能返回 304
+        group = Group.objects.create(name="before")
+        self.other.groups.add(group)
+        last_modified = http_date(self.other.updated_at.timestamp())
+        for name, url in (("list", "/demo/user/?expand=groups"), ("detail", "/demo/user/%d/?expand=groups" % self.other.pk)):
+            self.assertNotIn("ETag", self.client.get(url))
+            group.name = name
+            group.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH="*", HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('"name": "%s"' % name, json.dumps(response.json()))
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = mock.patch.object(middleware, "profile_store", ProfileStore(directory.name)).start()
+        self.addCleanup(mock.patch.stopall)
+        self.staff = User.objects.create_user(username="staff", password="x", is_staff=True)
+        self.plain = User.objects.create_user(username="plain", password="x")
+
+    def get(self, user, **extra):
+        return self.client.get(
+            "/demo/user/", HTTP_AUTHORIZATION="Bearer %s" % AccessToken.for_user(user), **extra
+        )
+
+    def test_staff_trigger_returns_profile_id(self):
+        response = self.get(self.staff, HTTP_X_PROFILE="1")
+        self.assertEqual(self.store.names(), [response["X-Profile-ID"]])
+        response = self.get(self.plain, HTTP_X_PROFILE="1")
+        self.assertNotIn("X-Profile-ID", response)
+        self.assertEqual(len(self.store.names()), 1)
+
+    def test_sampled_request_has_no_profile_id(self):
+        with mock.patch.object(middleware, "PROFILE_SAMPLE_RATE", 1.0):
+            response = self.get(self.plain)
+            self.assertNotIn("X-Profile-ID", response)
+            self.assertEqual(len(self.store.names()), 1)
+            # 被抽中的员工请求如果本身带了触发头，仍然返回结果名称
+            response = self.get(self.staff, HTTP_X_PROFILE="1")
+        self.assertIn(response["X-Profile-ID"], self.store.names())
+
+
+class UserSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username="creator", password="x")
+        self.user = User.objects.create_user(username="member", password="x", created_by=self.creator)
+        self.user.groups.add(Group.objects.create(name="group"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query["sql"] for query in queries]
+
+    def test_fields_narrow_the_query(self):
+        response, queries = self.get("/demo/user/?fields=id,username")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[1], {"id": self.user.pk, "username": "member"})
+        # ETag 的聚合查询之外只有一条查询，且只取需要的列
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("password", queries[1])
+        self.assertNotIn("groups", queries[1])
+
+    def test_expand_nests_relations(self):
+        response, queries = self.get("/demo/user/%d/?fields=id&expand=created_by,groups" % self.user.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "id": self.user.pk,
+            "created_by": {"id": self.creator.pk, "username": "creator", "nickname": ""},
+            "groups": [{"id": self.user.groups.get().pk, "name": "group"}],
+        })
+        # created_by 用 JOIN 取得，groups 一次预取
+        self.assertEqual(len(queries), 2)
+
+    def test_invalid_fields_are_rejected(self):
+        response, _ = self.get("/demo/user/?fields=id,nope&expand=password")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"fields", "expand"})
+        for url in ("/demo/user/?fields=", "/demo/user/%d/?fields=," % self.user.pk):
+            response, _ = self.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("fields", response.json())
+
+
+class LoadTestTests(SimpleTestCase):
+    def run_against(self, respond, **kwargs):
+        async def scenario():
+            async def handle(reader, writer):
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(respond)
+                await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            command = loadtest.Command()
+            command.mix = {"list": 1.0}
+            command.random = random.Random(0)
+            command.usernames = ["user"]
+            command.host, command.port = server.sockets[0].getsockname()[:2]
+            async with server:
+                return await command.run(**kwargs)
+
+        return asyncio.run(scenario())
+
+    def test_malformed_responses_are_errors(self):
+        for respond in (b"", b"HTTP/1.1"):
+            for rate in (0, 1000):
+                report = self.run_against(respond, total=5, concurrency=2, rate=rate)
+                self.assertEqual(report["operations"]["list"]["count"], 5)
+                self.assertEqual(report["operations"]["list"]["statuses"], {"0": 5})
+
+    def test_open_loop_latency_includes_queueing(self):
+        command = loadtest.Command()
+        command.mix = {"list": 1.0}
+        command.random = random.Random(0)
+
+        async def slow_list():
+            # 阻塞事件循环，后面的请求都晚于计划时间发出
+            time.sleep(0.02)
+            return 200
+
+        command.do_list = slow_list
+        command.do_login = slow_list
+        report = asyncio.run(command.run(total=5, concurrency=1, rate=1000))
+        latency = report["operations"]["list"]["latency_ms"]
+        # 最后一个请求计划在 4ms 发出，实际要等前面的请求都执行完
+        self.assertGreater(latency["max"], 60)
+
+
+class SnapshotModelPermissionsTests(TestCase):
+    def setUp(self):
+        get_permission_ids.cache_clear()
+        self.addCleanup(get_permission_ids.cache_clear)
+        self.user = User.objects.create_user(username="perms", password="x")
+        self.view = SimpleNamespace(queryset=User.objects.all())
+
+    def has_permission(self, snapshot):
+        # 每次重新读用户，避免 ModelBackend 的权限缓存
+        user = User.objects.get(pk=self.user.pk)
+        request = SimpleNamespace(method="POST", user=user, auth={PERMISSIONS_CLAIM: snapshot})
+        return SnapshotModelPermissions().has_permission(request, self.view)
+
+    def grant(self):
+        self.user.user_permissions.add(Permission.objects.get(codename="add_user"))
+        self.user.save()
+        self.user.refresh_from_db()
+
+    def test_snapshot_hit_needs_no_permission_query(self):
+        self.grant()
+        snapshot = build_permission_snapshot(User.objects.get(pk=self.user.pk))
+        user = User.objects.get(pk=self.user.pk)
+        request = SimpleNamespace(method="POST", user=user, auth={PERMISSIONS_CLAIM: snapshot})
+        with self.assertNumQueries(0):
+            self.assertTrue(SnapshotModelPermissions().has_permission(request, self.view))
+
+    def test_stale_version_falls_back_to_database(self):
+        snapshot = build_permission_snapshot(self.user)
+        self.assertFalse(self.has_permission(snapshot))
+        # 授权后 perm_version 递增，旧快照不再使用
+        self.grant()
+        self.assertNotEqual(snapshot["v"], self.user.perm_version)
+        self.assertTrue(self.has_permission(snapshot))
+
+    def test_unknown_permission_falls_back_to_database(self):
+        self.grant()
+        snapshot = dict(build_permission_snapshot(self.user), b=permissions.encode_permission_bits([]))
+        # 快照中没有该权限时直接拒绝；快照不认识的权限由数据库判断
+        self.assertFalse(self.has_permission(snapshot))
+        with mock.patch.object(permissions, "get_permission_ids", return_value={}):
+            self.assertTrue(self.has_permission(snapshot))
+
+
+class WebhookTests(TestCase):
+    secret = "webhook-secret"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.queue = WebhookQueue(os.path.join(directory.name, "webhooks.sqlite3"))
+        self.addCleanup(lambda: self.queue.connection.close())
+        mock.patch.object(views, "webhook_queue", self.queue).start()
+        mock.patch.object(webhooks, "webhook_queue", self.queue).start()
+        mock.patch("demo.management.commands.processwebhooks.webhook_queue", self.queue).start()
+        mock.patch.object(views, "WEBHOOK_SECRET", self.secret).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def post(self, body, delivery="d1", event="push", secret=secret):
+        signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.post(
+            "/demo/user/callback/", body, content_type="application/json",
+            HTTP_X_HUB_SIGNATURE_256=signature, HTTP_X_GITHUB_DELIVERY=delivery, HTTP_X_GITHUB_EVENT=event,
+        )
+
+    def statuses(self):
+        return dict(self.queue.connection.execute("SELECT delivery_id, status FROM webhook_event"))
+
+    def test_signature_is_checked(self):
+        self.assertEqual(self.post(b"{}", secret="wrong").status_code, 403)
+        self.assertEqual(self.statuses(), {})
+
+    def test_delivery_is_queued_once(self):
+        body = json.dumps({"repository": {"full_name": "a/b"}, "ref": "refs/heads/main", "after": "c1"}).encode()
+        response = self.post(body)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"delivery": "d1", "duplicate": False})
+        self.assertTrue(self.post(body).json()["duplicate"])
+        self.assertEqual(self.statuses(), {"d1": STATUS_PENDING})
+
+        call_command("processwebhooks", once=True)
+        self.assertEqual(self.statuses(), {"d1": STATUS_DONE})
+        job = Job.objects.get()
+        self.assertEqual(job.payload, {"repository": "a/b", "ref": "refs/heads/main", "commit": "c1"})
+        # 已处理的重复投递也不会再入队
+        self.assertTrue(self.post(body).json()["duplicate"])
+
+    def test_claim_and_finish(self):
+        for delivery in ("d1", "d2", "d3"):
+            self.queue.append(delivery, "ping", b"{}")
+        rows = self.queue.claim(limit=2)
+        self.assertEqual([row[1] for row in rows], ["d1", "d2"])
+        self.assertEqual([row[1] for row in self.queue.claim(limit=5)], ["d3"])
+        self.queue.finish([rows[0][0]])
+        self.queue.finish([rows[1][0]], STATUS_FAILED)
+        self.assertEqual(self.statuses(), {"d1": STATUS_DONE, "d2": STATUS_FAILED, "d3": STATUS_PROCESSING})
+
+    def test_only_stale_claims_are_requeued(self):
+        self.queue.append("old", "ping", b"{}")
+        with mock.patch.object(webhooks.time, "time", return_value=time.time() - 3600):
+            self.queue.claim()
+        self.queue.append("live", "ping", b"{}")
+        self.queue.claim()
+        # 另一个处理进程启动时只回收过期的租约
+        self.assertEqual(self.queue.requeue_stale(lease=60), 1)
+        self.assertEqual(self.statuses(), {"old": STATUS_PENDING, "live": STATUS_PROCESSING})
+
+    def test_purge_keeps_recent_and_unfinished_events(self):
+        with mock.patch.object(webhooks.time, "time", return_value=time.time() - 7200):
+            for delivery in ("done", "pending"):
+                self.queue.append(delivery, "ping", b"{}")
+        self.queue.append("recent", "ping", b"{}")
+        [(event_id, *_)] = self.queue.claim(limit=1)
+        self.queue.finish([event_id])
+        self.assertEqual(self.queue.purge(retention=3600), 1)
+        self.assertEqual(set(self.statuses()), {"pending", "recent"})
+        # 去重窗口之内仍然能识别重复投递
+        self.assertFalse(self.queue.append("recent", "ping", b"{}"))
+
+
+class TokenObtainTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="login", password="secret")
+
+    def login(self, url="/demo/login/"):
+        return self.client.post(url, {"username": "login", "password": "secret"})
+
+    def test_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"refresh", "access"})
+
+    def test_deleted_user_cannot_login(self):
+        self.user.soft_delete()
+        for url in ("/demo/login/", "/demo/login/sliding/"):
+            response = self.login(url)
+            self.assertEqual(response.status_code, 401)
+            self.assertNotIn("access", response.json())
+
+
+class SlidingTokenTests(TestCase):
+    refresh_url = "/demo/refresh/sliding/"
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="sliding", password="secret")
+        caches[TOKEN_GENERATION_CACHE].delete(token_generation_cache_key(self.user.pk))
+        self.addCleanup(caches[TOKEN_GENERATION_CACHE].delete, token_generation_cache_key(self.user.pk))
+
+    def refresh(self, token):
+        return self.client.post(self.refresh_url, {"token": str(token)})
+
+    def test_login_issues_sliding_token(self):
+        response = self.client.post("/demo/login/sliding/", {"username": "sliding", "password": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(SlidingToken(response.json()["token"])["user_id"], self.user.pk)
+
+    def test_refresh_after_exp(self):
+        token = SlidingToken.for_user(self.user)
+        token.set_exp(from_time=token.current_time - timedelta(hours=1))
+        with self.assertRaises(TokenError):
+            SlidingToken(str(token))
+
+        with self.assertNumQueries(0):
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        refreshed = SlidingToken(response.json()["token"])
+        self.assertGreater(refreshed["exp"], token["exp"])
+        self.assertEqual(refreshed[SLIDING_TOKEN_REFRESH_EXP_CLAIM], token[SLIDING_TOKEN_REFRESH_EXP_CLAIM])
+
+    def test_refresh_rejected_after_refresh_exp(self):
+        token = SlidingToken.for_user(self.user)
+        token.set_exp(SLIDING_TOKEN_REFRESH_EXP_CLAIM, from_time=token.current_time - timedelta(days=2))
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+
+    def test_access_token_rejected(self):
+        response = self.refresh(AccessToken.for_user(self.user))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["code"], "token_not_valid")
+
+    def test_revoked_session_cannot_refresh(self):
+        token = SlidingToken.for_user(self.user)
+        self.user.revoke_tokens()
+        with self.assertNumQueries(0):
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["detail"], "Token has been revoked")
+
+
+class GenerateDataTests(TestCase):
+    options = {"users": 30, "chunk_size": 10, "batch_size": 4, "tokens_per_user": 1.0, "seed": 3, "now": 1.7e9}
+
+    def generate(self, **options):
+        call_command("generatedata", stdout=io.StringIO(), **dict(self.options, **options))
+
+    def snapshot(self):
+        users = list(User.objects.filter(username__startswith=generatedata.SYNTHETIC_USER_PREFIX).order_by("id").values())
+        for user in users:
+            # auto_now 字段取插入时的时间
+            del user["updated_at"]
+        tokens = list(OutstandingToken.objects.order_by("jti").values_list("user_id", "jti", "token", "created_at", "expires_at"))
+        return users, tokens
+
+    def test_chunk_order_does_not_change_output(self):
+        with mock.patch.object(generatedata, "STAFF_RATE", 0.3):
+            for chunks in ("2:3", ":1", "1:2"):
+                self.generate(chunks=chunks)
+            out_of_order = self.snapshot()
+            self.assertEqual(len(out_of_order[0]), 30)
+
+            # 重跑不产生重复数据
+            self.generate()
+            self.assertEqual(self.snapshot(), out_of_order)
+
+            User.objects.filter(username__startswith=generatedata.SYNTHETIC_USER_PREFIX).delete()
+            OutstandingToken.objects.all().delete()
+            self.generate()
+            self.assertEqual(self.snapshot(), out_of_order)
+
+        staff = User.objects.filter(is_staff=True)
+        self.assertTrue(staff.exists())
+        self.assertFalse(any(user.has_usable_password() for user in staff))
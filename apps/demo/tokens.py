@@ -1,4 +1,6 @@
+from base64 import urlsafe_b64encode
 from datetime import timedelta
+from os import urandom
 from uuid import uuid4
 
 from django.conf import settings
@@ -7,7 +9,9 @@ from django.utils.translation import gettext_lazy as _
 
 from .exceptions import TokenBackendError, TokenError
 from .utils import aware_utcnow, datetime_from_epoch, datetime_to_epoch, format_lazy
-from token_blacklist.models import OutstandingToken
+from demo.models import get_token_generation
+from token_blacklist.models import BlacklistedToken, OutstandingToken
+from token_blacklist.revocation import get_revocation_set
 
 TOKEN_TYPE_CLAIM = "token_type"
 JTI_CLAIM = "jti"
@@ -18,6 +22,46 @@ REFRESH_TOKEN_LIFETIME = timedelta(days=1)
 SLIDING_TOKEN_LIFETIME = timedelta(minutes=5)
 SLIDING_TOKEN_REFRESH_LIFETIME = timedelta(days=1)
 SLIDING_TOKEN_REFRESH_EXP_CLAIM = "refresh_exp"
+PERMISSIONS_CLAIM = "perms"
+GENERATION_CLAIM = "gen"
+
+# 紧凑声明格式: 缩短声明名称和令牌类型，jti 使用 16 字节随机数的 base64url 编码。
+# 解码时两种格式都接受，便于迁移。
+COMPACT_CLAIMS = getattr(settings, "JWT_COMPACT_CLAIMS", False)
+COMPACT_CLAIM_NAMES = {TOKEN_TYPE_CLAIM: "t", USER_ID_CLAIM: "uid", PERMISSIONS_CLAIM: "p", GENERATION_CLAIM: "g"}
+COMPACT_TOKEN_TYPES = {"access": "a", "refresh": "r", "sliding": "s"}
+# 紧凑格式下刷新令牌只把这些声明复制到访问令牌
+ACCESS_TOKEN_COPY_CLAIMS = (USER_ID_CLAIM, PERMISSIONS_CLAIM, GENERATION_CLAIM)
+
+_EXPANDED_CLAIM_NAMES = {v: k for k, v in COMPACT_CLAIM_NAMES.items()}
+_EXPANDED_TOKEN_TYPES = {v: k for k, v in COMPACT_TOKEN_TYPES.items()}
+
+
+def compact_payload(payload):
+    """
+    把标准声明转换为紧凑声明。
+    """
+    compact = {}
+    for claim, value in payload.items():
+        if claim == TOKEN_TYPE_CLAIM:
+            value = COMPACT_TOKEN_TYPES.get(value, value)
+        compact[COMPACT_CLAIM_NAMES.get(claim, claim)] = value
+    return compact
+
+
+def expand_payload(payload):
+    """
+    把紧凑声明还原为标准声明，标准格式的载荷原样返回。
+    """
+    if not any(claim in payload for claim in _EXPANDED_CLAIM_NAMES):
+        return payload
+    expanded = {}
+    for claim, value in payload.items():
+        claim = _EXPANDED_CLAIM_NAMES.get(claim, claim)
+        if claim == TOKEN_TYPE_CLAIM:
+            value = _EXPANDED_TOKEN_TYPES.get(value, value)
+        expanded[claim] = value
+    return expanded
 
 
 class Token:
@@ -28,16 +72,19 @@ class Token:
 
     token_type = None
     lifetime = None
+    compact_claims = COMPACT_CLAIMS
 
-    def __init__(self, token=None, verify=True):
+    def __init__(self, token=None, verify=True, verify_exp=True):
         """
         如果给定的令牌无效、过期或不安，必须引发带有面向用户错误的 TokenError 消息。
+        verify_exp 为假时仍校验签名，但不检查 exp (用于滑动令牌续期)。
         """
         if self.token_type is None or self.lifetime is None:
             raise TokenError(_("Cannot create token with no type or lifetime"))
 
         self.token = token
         self.current_time = aware_utcnow()
+        self.verify_exp = verify_exp
 
         # 设置令牌
         if token is not None:
@@ -46,7 +93,7 @@ class Token:
 
             # Decode token
             try:
-                self.payload = token_backend.decode(token, verify=verify)
+                self.payload = expand_payload(token_backend.decode(token, verify=verify, verify_exp=verify_exp))
             except TokenBackendError:
                 raise TokenError(_("Token is invalid or expired"))
 
@@ -85,7 +132,8 @@ class Token:
         """
         标记并返回一个标记为base64编码的字符串。
         """
-        return self.get_token_backend().encode(self.payload)
+        payload = compact_payload(self.payload) if self.compact_claims else self.payload
+        return self.get_token_backend().encode(payload)
 
     def verify(self):
         """
@@ -93,7 +141,8 @@ class Token:
         """
         # (https://tools.ietf.org/html/rfc7519#section-4.1.4).
         # 根据RFC 7519， exp 声明是可选的作为授权令牌更正确的行为，我们需要一个 exp 声明。我们不希望有僵尸 Token 到处乱走。
-        self.check_exp()
+        if self.verify_exp:
+            self.check_exp()
 
         # 如果默认值不是None，那么我们应该强制这些设置的要求。如上所述，规范将这些标记为可选的。
         if "jti" not in self.payload:
@@ -103,6 +152,8 @@ class Token:
 
             self.verify_token_type()
 
+        self.check_revoked()
+
     def verify_token_type(self):
         """
         Ensures that the token type claim is present and has the correct value.
@@ -115,6 +166,48 @@ class Token:
         if self.token_type != token_type:
             raise TokenError(_("Token has wrong type"))
 
+    def check_revoked(self):
+        """
+        在共享的内存映射吊销集合中检查 jti，未配置吊销文件时跳过。
+        """
+        revocation_set = get_revocation_set()
+        if revocation_set is not None and revocation_set.is_revoked(self.payload[JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def check_generation(self, use_database=True):
+        """
+        令牌的代数低于用户当前的令牌代数时，说明签发后用户吊销了全部会话。
+        没有代数声明的令牌视为第 0 代。
+
+        优先读缓存，缓存未命中时才查询数据库，因此 verify() 不调用；
+        请求认证(JWTAuthentication.get_user)、网关校验(/demo/verify/ 与 runtokenverifier)
+        和离线工具(如 audittokens --check-generation)显式调用。
+        use_database 为假时只读缓存，缓存未命中视为未吊销。
+        """
+        user_id = self.payload.get(USER_ID_CLAIM)
+        if user_id is None:
+            return
+        current = get_token_generation(user_id, use_database=use_database)
+        if current is not None and self.payload.get(GENERATION_CLAIM, 0) < current:
+            raise TokenError(_("Token has been revoked"))
+
+    def blacklist(self):
+        """
+        将令牌加入黑名单，吊销集合会在下次重建时包含它。
+        """
+        jti = self.payload[JTI_CLAIM]
+        exp = self.payload["exp"]
+
+        token, _created = OutstandingToken.objects.get_or_create(
+            jti=jti,
+            defaults={
+                "token": str(self),
+                "expires_at": datetime_from_epoch(exp),
+            },
+        )
+
+        return BlacklistedToken.objects.get_or_create(token=token)
+
     def set_jti(self):
         """
         Populates the configured jti claim of a token with a string where there
@@ -124,7 +217,10 @@ class Token:
         See here:
         https://tools.ietf.org/html/rfc7519#section-4.1.7
         """
-        self.payload[JTI_CLAIM] = uuid4().hex
+        if self.compact_claims:
+            self.payload[JTI_CLAIM] = urlsafe_b64encode(urandom(16)).rstrip(b"=").decode("ascii")
+        else:
+            self.payload[JTI_CLAIM] = uuid4().hex
 
     def set_exp(self, claim="exp", from_time=None, lifetime=None):
         """
@@ -184,6 +280,7 @@ class Token:
 
         token = cls()
         token[USER_ID_CLAIM] = user_id
+        token[GENERATION_CLAIM] = getattr(user, "token_generation", 0)
 
         return token
 
@@ -236,6 +333,7 @@ class RefreshToken(Token):
         JTI_CLAIM,
         "jti",
     )
+    access_copy_claims = ACCESS_TOKEN_COPY_CLAIMS
     access_token_class = AccessToken
 
     @property
@@ -253,9 +351,13 @@ class RefreshToken(Token):
         access.set_exp(from_time=self.current_time)
 
         no_copy = self.no_copy_claims
+        # 紧凑格式下只复制白名单中的声明
+        copy_only = self.access_copy_claims if self.compact_claims else None
         for claim, value in self.payload.items():
             if claim in no_copy:
                 continue
+            if copy_only is not None and claim not in copy_only:
+                continue
             access[claim] = value
 
         return access
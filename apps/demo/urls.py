@@ -1,11 +1,20 @@
 from django.urls import re_path, include, path
 from rest_framework import routers
 
-from .views import UserViewSet, token_obtain_pair
+from .views import (
+    UserViewSet, jwks, profile_download, profile_list, token_batch_verify, token_obtain_pair, token_obtain_sliding,
+    token_refresh_sliding,
+)
 
 router = routers.DefaultRouter()
 router.register(r'user', UserViewSet)
 urlpatterns = [
     path(r'', include(router.urls)),
     path('login/', token_obtain_pair),
+    path('login/sliding/', token_obtain_sliding),
+    path('refresh/sliding/', token_refresh_sliding),
+    path('verify/', token_batch_verify),
+    path('jwks/', jwks),
+    path('profiles/', profile_list),
+    path('profiles/<str:name>/', profile_download),
 ]
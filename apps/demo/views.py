@@ -1,29 +1,48 @@
+import logging
 
 from django.contrib.auth.hashers import make_password
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 
 # Create your views here.
+from base.views import ConditionalGetMixin, SparseFieldsViewMixin
 from drf_spectacular.utils import extend_schema
 from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
 from django.utils.module_loading import import_string
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from .authentication import AUTH_HEADER_TYPES
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
+from .authentication import AUTH_HEADER_TYPES, JWTAuthentication
 from .serializers import UserSerializer
 from .models import User
 from .exceptions import InvalidToken, TokenError
+from .codec import codec
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, generate_latest
 from .permissions import AllowPostPermission
-from demo.serializers import TokenObtainPairSerializer
+from .profiling import profile_store
+from .state import token_backend
+from .webhooks import (
+    DELIVERY_HEADER, EVENT_HEADER, SIGNATURE_HEADER, WEBHOOK_SECRET, verify_signature, webhook_queue,
+)
+from demo.serializers import (
+    TokenBatchVerifySerializer, TokenObtainPairSerializer, TokenObtainSlidingSerializer,
+    TokenRefreshSlidingSerializer,
+)
 
+logger = logging.getLogger(__name__)
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class UserViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     用户管理视图集
     """
     permission_classes = [AllowPostPermission | IsAuthenticated]
-    queryset = User.objects.all()
+    # 软删除的用户不出现在列表和详情中，过滤条件走 (deleted_at, id) 索引
+    queryset = User.objects.alive().order_by('id')
     serializer_class = UserSerializer
+    required_columns = ('updated_at',)
 
     @extend_schema(
         request=UserSerializer,
@@ -33,10 +52,37 @@ class UserViewSet(viewsets.ModelViewSet):
         # request.data['password'] = make_password(request.data['password'], hasher='pbkdf2_sha256')
         return super().create(request)
 
-    @action(detail=False, methods=['get'])
+    def perform_destroy(self, instance):
+        instance.soft_delete(user=self.request.user)
+
+    @action(detail=True, methods=['post'], url_path='revoke-sessions', permission_classes=[IsAuthenticated])
+    def revoke_sessions(self, request, pk=None):
+        """
+        吊销该用户的全部会话(已签发的令牌)，只能吊销自己的，管理员可以吊销任何用户的。
+        """
+        user = self.get_object()
+        if user.pk != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied()
+        return Response({"token_generation": user.revoke_tokens()}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[AllowAny], authentication_classes=())
     def callback(self, request):
-        print(request)
-        return Response("你好")
+        """
+        接收 GitHub webhook：校验签名、按 delivery id 去重后写入本地队列，立即返回 202。
+        解析和分发由 processwebhooks 命令完成。
+        """
+        body = request.body
+        if not verify_signature(WEBHOOK_SECRET, body, request.META.get(SIGNATURE_HEADER)):
+            raise PermissionDenied("Invalid webhook signature")
+
+        delivery_id = request.META.get(DELIVERY_HEADER)
+        event = request.META.get(EVENT_HEADER)
+        if not delivery_id or not event:
+            raise ValidationError("Missing webhook delivery or event header")
+
+        queued = webhook_queue.append(delivery_id, event, body)
+        logger.debug("webhook %s (%s) queued=%s", delivery_id, event, queued)
+        return Response({"delivery": delivery_id, "duplicate": not queued}, status=status.HTTP_202_ACCEPTED)
 
 
 class TokenViewBase(generics.GenericAPIView):
@@ -109,4 +155,133 @@ class TokenObtainPairView(generics.GenericAPIView):
         return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
+class TokenObtainSlidingView(TokenViewBase):
+    """
+    获取一组用户凭证，返回一个滑动令牌；令牌本身即可用于认证，并可在 refresh_exp 之前续期。
+    """
+    serializer_class = TokenObtainSlidingSerializer
+
+
+class TokenRefreshSlidingView(TokenViewBase):
+    """
+    滑动令牌续期，不查询数据库。
+    """
+    serializer_class = TokenRefreshSlidingSerializer
+
+
+class TokenBatchVerifyView(TokenViewBase):
+    """
+    批量校验令牌，返回每个令牌的有效性、声明和错误码。
+    同一批次内相同的令牌只校验一次；stream 为真时按令牌首次出现的顺序逐个校验，
+    每校验完一个立即写出一行 NDJSON，客户端不必等整批校验结束。
+    """
+    serializer_class = TokenBatchVerifySerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        tokens = serializer.validated_data["tokens"]
+        # 去重并保留原始位置，重复的令牌共享一次校验结果
+        positions = {}
+        for index, token in enumerate(tokens):
+            positions.setdefault(token, []).append(index)
+
+        authenticator = JWTAuthentication()
+        if serializer.validated_data["stream"]:
+            return StreamingHttpResponse(
+                self.stream_results(authenticator, positions),
+                content_type="application/x-ndjson",
+            )
+
+        results = [None] * len(tokens)
+        for token, indexes in positions.items():
+            result = self.verify_token(authenticator, token)
+            for index in indexes:
+                results[index] = result
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    def stream_results(self, authenticator, positions):
+        for token, indexes in positions.items():
+            result = dict(self.verify_token(authenticator, token), indexes=indexes)
+            yield codec.dumps(result) + b"\n"
+
+    @staticmethod
+    def verify_token(authenticator, token):
+        """
+        复用 JWTAuthentication 的令牌校验流程，把异常转换为单个结果。
+        用户吊销全部会话后签发的旧令牌同样视为无效。
+        """
+        try:
+            validated_token = authenticator.get_validated_token(token)
+            validated_token.check_generation()
+        except TokenError as e:
+            return {
+                "valid": False,
+                "claims": None,
+                "code": "token_revoked",
+                "detail": str(e.args[0]),
+            }
+        except InvalidToken as e:
+            # 只有一种令牌类型时，直接返回具体的失败原因
+            messages = e.detail.get("messages") or [e.detail]
+            return {
+                "valid": False,
+                "claims": None,
+                "code": str(e.detail.get("code", InvalidToken.default_code)),
+                "detail": str(messages[0].get("message", messages[0].get("detail"))),
+            }
+        return {
+            "valid": True,
+            "claims": validated_token.payload,
+            "code": None,
+            "detail": None,
+        }
+
+
+def metrics(request):
+    """
+    以 Prometheus 文本格式导出指标。
+    """
+    return HttpResponse(generate_latest(), content_type=METRICS_CONTENT_TYPE)
+
+
+def jwks(request):
+    """
+    导出验签公钥(JWKS)。
+    """
+    return JsonResponse(token_backend.get_jwks())
+
+
+@extend_schema(exclude=True)
+class ProfileListView(APIView):
+    """
+    列出 ProfilingMiddleware 保存的分析结果，最新的在前。
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"results": profile_store.list()})
+
+
+@extend_schema(exclude=True)
+class ProfileDownloadView(APIView):
+    """
+    下载一份分析结果：kind=prof(默认)为 pstats 文件，kind=json 为摘要和 SQL 列表。
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name):
+        kind = request.query_params.get("kind", "prof")
+        path = profile_store.file_path(name, kind)
+        if path is None:
+            raise NotFound()
+        return FileResponse(open(path, "rb"), as_attachment=kind == "prof", filename="%s.%s" % (name, kind))
+
+
 token_obtain_pair = TokenObtainPairView.as_view()
+token_obtain_sliding = TokenObtainSlidingView.as_view()
+token_refresh_sliding = TokenRefreshSlidingView.as_view()
+token_batch_verify = TokenBatchVerifyView.as_view()
+profile_list = ProfileListView.as_view()
+profile_download = ProfileDownloadView.as_view()
@@ -0,0 +1,178 @@
+"""
+Webhook 本地持久队列。
+
+请求线程只校验签名并把原始请求体追加到 SQLite(WAL) 队列，解析和分发由 processwebhooks 命令在请求之外完成。
+"""
+import hashlib
+import hmac
+import logging
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+from jobs.models import Job
+
+WEBHOOK_SECRET = getattr(settings, "WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_PATH = str(getattr(settings, "WEBHOOK_QUEUE_PATH", "webhooks.sqlite3"))
+SIGNATURE_HEADER = "HTTP_X_HUB_SIGNATURE_256"
+DELIVERY_HEADER = "HTTP_X_GITHUB_DELIVERY"
+EVENT_HEADER = "HTTP_X_GITHUB_EVENT"
+# 处理中的事件超过这段时间没有完成，视为处理进程已经退出，重新放回队列
+WEBHOOK_LEASE_SECONDS = getattr(settings, "WEBHOOK_LEASE_SECONDS", 300)
+# 已完成/失败的事件保留这段时间用于按 delivery id 去重(GitHub 可以重新投递 3 天内的事件)
+WEBHOOK_RETENTION_SECONDS = getattr(settings, "WEBHOOK_RETENTION_SECONDS", 3 * 24 * 3600)
+
+STATUS_PENDING = 0
+STATUS_PROCESSING = 1
+STATUS_DONE = 2
+STATUS_FAILED = 3
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_event (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    delivery_id TEXT NOT NULL UNIQUE,
+    event TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    received_at REAL NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS webhook_event_status ON webhook_event (status, id);
+CREATE INDEX IF NOT EXISTS webhook_event_received ON webhook_event (received_at);
+"""
+
+
+def verify_signature(secret, body, signature):
+    """
+    校验 GitHub 的 X-Hub-Signature-256 头。
+    """
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+class WebhookQueue:
+    """
+    每个线程一个 SQLite 连接的追加队列，delivery_id 唯一约束用于去重。
+    """
+
+    def __init__(self, path=WEBHOOK_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(webhook_event)")]
+            if columns and "claimed_at" not in columns:
+                # 旧版本创建的队列文件
+                connection.execute("ALTER TABLE webhook_event ADD COLUMN claimed_at REAL")
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def append(self, delivery_id, event, payload):
+        """
+        追加事件，返回 False 表示该 delivery_id 已经收到过。
+        """
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO webhook_event (delivery_id, event, payload, received_at) "
+            "VALUES (?, ?, ?, ?)",
+            (delivery_id, event, payload, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, limit=100):
+        """
+        取出一批待处理事件并标记为处理中，记录领取时间。
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT id, delivery_id, event, payload FROM webhook_event "
+                "WHERE status = ? ORDER BY id LIMIT ?",
+                (STATUS_PENDING, limit),
+            ).fetchall()
+            if rows:
+                now = time.time()
+                connection.executemany(
+                    "UPDATE webhook_event SET status = ?, attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                    [(STATUS_PROCESSING, now, row[0]) for row in rows],
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return rows
+
+    def finish(self, event_ids, status=STATUS_DONE):
+        self.connection.executemany(
+            "UPDATE webhook_event SET status = ? WHERE id = ?",
+            [(status, event_id) for event_id in event_ids],
+        )
+
+    def requeue_stale(self, max_attempts=5, lease=WEBHOOK_LEASE_SECONDS):
+        """
+        把领取超过 lease 秒仍未完成的事件放回队列(处理进程异常退出)，返回处理的事件数。
+        其它处理进程正在处理的事件不受影响。
+        """
+        cursor = self.connection.execute(
+            "UPDATE webhook_event SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, claimed_at = NULL "
+            "WHERE status = ? AND (claimed_at IS NULL OR claimed_at < ?)",
+            (max_attempts, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING, time.time() - lease),
+        )
+        return cursor.rowcount
+
+    def purge(self, retention=WEBHOOK_RETENTION_SECONDS):
+        """
+        删除超过去重窗口的已完成/失败事件，返回删除的事件数。
+        """
+        cursor = self.connection.execute(
+            "DELETE FROM webhook_event WHERE received_at < ? AND status IN (?, ?)",
+            (time.time() - retention, STATUS_DONE, STATUS_FAILED),
+        )
+        return cursor.rowcount
+
+
+webhook_queue = WebhookQueue()
+
+# 事件类型 -> 处理函数，处理函数接收解析后的 JSON 载荷
+HANDLERS = {}
+
+
+def register_handler(event):
+    def decorator(func):
+        HANDLERS[event] = func
+        return func
+
+    return decorator
+
+
+@register_handler("ping")
+def handle_ping(payload):
+    logger.info("webhook ping: %s", payload.get("zen"))
+
+
+@register_handler("push")
+def handle_push(payload):
+    repository = payload.get("repository", {}).get("full_name")
+    logger.info("push to %s %s", repository, payload.get("ref"))
+    Job.objects.create(
+        kind="push",
+        payload={
+            "repository": repository,
+            "ref": payload.get("ref"),
+            "commit": payload.get("after"),
+        },
+    )
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'priority', 'runner', 'attempts', 'lease_expires_at')
+    list_filter = ('status',)
+    ordering = ('-id',)
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from uuid import uuid4
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Job
+
+LEASE_LIFETIME = timedelta(seconds=60)
+MAX_CLAIM_BATCH = 50
+
+
+def claim_jobs(runner, limit=1, lease=LEASE_LIFETIME):
+    """
+    为 runner 原子地领取最多 limit 个待执行任务并加上租约。
+
+    支持 SKIP LOCKED 的数据库上并发领取互不阻塞；其他数据库(如 SQLite)通过带状态条件的
+    UPDATE 保证同一任务只会被一个 runner 领取。
+    """
+    limit = max(1, min(limit, MAX_CLAIM_BATCH))
+    now = timezone.now()
+    token = uuid4().hex
+    claimed = dict(
+        status=Job.RUNNING,
+        runner=runner,
+        lease_token=token,
+        lease_expires_at=now + lease,
+        attempts=F('attempts') + 1,
+        started_at=now,
+    )
+    candidates = Job.objects.alive().filter(status=Job.PENDING, available_at__lte=now).order_by('-priority', 'id')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(candidates.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+        else:
+            ids = list(candidates.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        Job.objects.filter(pk__in=ids, status=Job.PENDING).update(**claimed)
+
+    # 只返回本次租约真正领取到的任务
+    return list(Job.objects.filter(pk__in=ids, lease_token=token).order_by('-priority', 'id'))
+
+
+def heartbeat(job_id, lease_token, lease=LEASE_LIFETIME):
+    """
+    延长租约，租约已丢失时返回 False。
+    """
+    return bool(
+        Job.objects.filter(pk=job_id, status=Job.RUNNING, lease_token=lease_token)
+        .update(lease_expires_at=timezone.now() + lease)
+    )
+
+
+def complete(job_id, lease_token, succeeded, result=None):
+    return bool(
+        Job.objects.filter(pk=job_id, status=Job.RUNNING, lease_token=lease_token).update(
+            status=Job.SUCCEEDED if succeeded else Job.FAILED,
+            finished_at=timezone.now(),
+            lease_expires_at=None,
+            result=result,
+        )
+    )
+
+
+def requeue_expired():
+    """
+    把租约已过期的任务放回队列，超过最大次数的标记为失败。返回处理的任务数。
+    """
+    now = timezone.now()
+    return Job.objects.filter(status=Job.RUNNING, lease_expires_at__lt=now).update(
+        status=Case(
+            When(attempts__gte=F('max_attempts'), then=Value(Job.FAILED)),
+            default=Value(Job.PENDING),
+        ),
+        finished_at=Case(
+            When(attempts__gte=F('max_attempts'), then=Value(now)),
+            default=Value(None),
+        ),
+        runner='',
+        lease_token='',
+        lease_expires_at=None,
+    )
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...leases import requeue_expired
+
+
+class Command(BaseCommand):
+    help = "Requeues running jobs whose lease has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Sweep every N seconds instead of once",
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            count = requeue_expired()
+            if count:
+                self.stdout.write("Requeued %d expired jobs" % count)
+            if not kwargs["interval"]:
+                break
+            time.sleep(kwargs["interval"])
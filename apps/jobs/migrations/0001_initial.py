@@ -0,0 +1,49 @@
+# Generated by Django 4.0.5 on 2026-10-18 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.CharField(max_length=20, null=True)),
+                ('deleted_at', models.CharField(max_length=20, null=True)),
+                ('kind', models.CharField(help_text='任务类型，如 push', max_length=50)),
+                ('payload', models.JSONField(default=dict, help_text='任务参数')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('succeeded', 'succeeded'), ('failed', 'failed')], default='pending', help_text='任务状态', max_length=20)),
+                ('priority', models.IntegerField(default=0, help_text='优先级，越大越先领取')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='最早可领取时间')),
+                ('runner', models.CharField(blank=True, help_text='领取任务的 runner', max_length=100)),
+                ('lease_token', models.CharField(blank=True, help_text='本次领取的租约标识', max_length=32)),
+                ('lease_expires_at', models.DateTimeField(help_text='租约到期时间，心跳时延长', null=True)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='已领取次数')),
+                ('max_attempts', models.PositiveIntegerField(default=3, help_text='最大领取次数')),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('result', models.JSONField(blank=True, help_text='执行结果', null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(app_label)s_%(class)s_created', to=settings.AUTH_USER_MODEL)),
+                ('deleted_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='%(app_label)s_%(class)s_deleted', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', '-priority', 'id'], name='job_claim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='job_lease_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.5 on 2026-10-19 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0002_job_soft_delete_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='job',
+            name='job_claim_idx',
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['deleted_at', 'status', '-priority', 'id'], name='job_claim_idx'),
+        ),
+    ]
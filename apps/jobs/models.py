@@ -0,0 +1,46 @@
+from django.db import models
+from django.utils import timezone
+
+from base.models import ReviewBaseModels
+
+
+class Job(ReviewBaseModels):
+    """
+    CI 任务，由 runner 通过租约领取执行。
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (SUCCEEDED, 'succeeded'),
+        (FAILED, 'failed'),
+    )
+
+    kind = models.CharField(max_length=50, help_text='任务类型，如 push')
+    payload = models.JSONField(default=dict, help_text='任务参数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING, help_text='任务状态')
+    priority = models.IntegerField(default=0, help_text='优先级，越大越先领取')
+    available_at = models.DateTimeField(default=timezone.now, help_text='最早可领取时间')
+    runner = models.CharField(max_length=100, blank=True, help_text='领取任务的 runner')
+    lease_token = models.CharField(max_length=32, blank=True, help_text='本次领取的租约标识')
+    lease_expires_at = models.DateTimeField(null=True, help_text='租约到期时间，心跳时延长')
+    attempts = models.PositiveIntegerField(default=0, help_text='已领取次数')
+    max_attempts = models.PositiveIntegerField(default=3, help_text='最大领取次数')
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    result = models.JSONField(null=True, blank=True, help_text='执行结果')
+
+    class Meta(ReviewBaseModels.Meta):
+        indexes = ReviewBaseModels.Meta.indexes + [
+            # 领取: WHERE deleted_at IS NULL AND status='pending' ORDER BY priority DESC, id，
+            # 已删除和历史任务不参与扫描
+            models.Index(fields=['deleted_at', 'status', '-priority', 'id'], name='job_claim_idx'),
+            # 回收: WHERE status='running' AND lease_expires_at < now
+            models.Index(fields=['status', 'lease_expires_at'], name='job_lease_idx'),
+        ]
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.kind, self.pk, self.status)
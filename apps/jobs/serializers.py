@@ -0,0 +1,35 @@
+from rest_framework import serializers
+
+from .leases import MAX_CLAIM_BATCH
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'kind', 'payload', 'status', 'priority', 'available_at', 'runner',
+            'lease_expires_at', 'attempts', 'max_attempts', 'started_at', 'finished_at', 'result',
+        )
+        read_only_fields = (
+            'status', 'runner', 'lease_expires_at', 'attempts', 'started_at', 'finished_at', 'result',
+        )
+
+
+class ClaimedJobSerializer(JobSerializer):
+    class Meta(JobSerializer.Meta):
+        fields = JobSerializer.Meta.fields + ('lease_token',)
+
+
+class ClaimSerializer(serializers.Serializer):
+    runner = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_CLAIM_BATCH, default=1)
+
+
+class LeaseSerializer(serializers.Serializer):
+    lease_token = serializers.CharField(max_length=32)
+
+
+class CompleteSerializer(LeaseSerializer):
+    succeeded = serializers.BooleanField()
+    result = serializers.JSONField(required=False, allow_null=True)
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from demo.models import User
+
+from .leases import claim_jobs, requeue_expired
+from .models import Job
+
+
+class JobLeaseTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="runner", password="secret"))
+
+    def claim(self, runner="r1", limit=1):
+        response = self.client.post("/jobs/job/claim/", {"runner": runner, "limit": limit}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_claim_heartbeat_complete(self):
+        low = Job.objects.create(kind="push", priority=0)
+        high = Job.objects.create(kind="push", priority=5)
+
+        [job] = self.claim()
+        self.assertEqual(job["id"], high.pk)
+        self.assertEqual(job["status"], Job.RUNNING)
+        self.assertEqual(job["attempts"], 1)
+        # 已领取的任务不会再被领取
+        self.assertEqual([j["id"] for j in self.claim(runner="r2", limit=5)], [low.pk])
+        self.assertEqual(self.claim(runner="r3"), [])
+
+        url = "/jobs/job/%d/" % high.pk
+        lease = {"lease_token": job["lease_token"]}
+        self.assertEqual(self.client.post(url + "heartbeat/", lease, format="json").status_code, 204)
+        wrong = {"lease_token": "0" * 32, "succeeded": True}
+        self.assertEqual(self.client.post(url + "complete/", wrong, format="json").status_code, 409)
+        done = dict(lease, succeeded=True, result={"ok": 1})
+        self.assertEqual(self.client.post(url + "complete/", done, format="json").status_code, 204)
+
+        high.refresh_from_db()
+        self.assertEqual(high.status, Job.SUCCEEDED)
+        self.assertEqual(high.result, {"ok": 1})
+        # 完成后租约失效
+        self.assertEqual(self.client.post(url + "heartbeat/", lease, format="json").status_code, 409)
+
+    def test_deleted_jobs_are_not_claimed(self):
+        deleted = Job.objects.create(kind="push", priority=10)
+        deleted.soft_delete()
+        alive = Job.objects.create(kind="push")
+        self.assertEqual([job["id"] for job in self.claim(limit=5)], [alive.pk])
+        self.assertEqual(self.client.get("/jobs/job/%d/" % deleted.pk).status_code, 404)
+        self.assertEqual([job["id"] for job in self.client.get("/jobs/job/").json()], [alive.pk])
+
+    def test_non_integer_pk_is_not_found(self):
+        lease = {"lease_token": "0" * 32, "succeeded": True}
+        for action in ("heartbeat", "complete"):
+            response = self.client.post("/jobs/job/abc/%s/" % action, lease, format="json")
+            self.assertEqual(response.status_code, 404)
+
+    def test_expired_lease_is_requeued(self):
+        job = Job.objects.create(kind="push", max_attempts=2)
+        [first] = claim_jobs("r1", lease=timedelta(seconds=-1))
+        self.assertEqual(requeue_expired(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.lease_token), (Job.PENDING, ""))
+
+        # 旧租约不能再续租或完成
+        url = "/jobs/job/%d/" % job.pk
+        lease = {"lease_token": first.lease_token, "succeeded": True}
+        self.assertEqual(self.client.post(url + "heartbeat/", lease, format="json").status_code, 409)
+        self.assertEqual(self.client.post(url + "complete/", lease, format="json").status_code, 409)
+
+        # 达到最大领取次数后标记为失败
+        [second] = claim_jobs("r2", lease=timedelta(seconds=-1))
+        self.assertEqual(second.attempts, 2)
+        self.assertEqual(requeue_expired(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
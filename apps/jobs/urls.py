@@ -0,0 +1,10 @@
+from django.urls import include, path
+from rest_framework import routers
+
+from .views import JobViewSet
+
+router = routers.DefaultRouter()
+router.register(r'job', JobViewSet)
+urlpatterns = [
+    path(r'', include(router.urls)),
+]
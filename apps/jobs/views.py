@@ -0,0 +1,45 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .leases import claim_jobs, complete, heartbeat
+from .models import Job
+from .serializers import ClaimSerializer, ClaimedJobSerializer, CompleteSerializer, JobSerializer, LeaseSerializer
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    任务视图集，runner 通过 claim 领取任务，heartbeat 续租，complete 上报结果
+    """
+    queryset = Job.objects.alive().order_by('-id')
+    serializer_class = JobSerializer
+    # heartbeat/complete 直接把 pk 交给 UPDATE，非数字的 pk 在路由层就返回 404
+    lookup_value_regex = '[0-9]+'
+
+    @extend_schema(request=ClaimSerializer, responses={200: ClaimedJobSerializer(many=True)})
+    @action(detail=False, methods=['post'])
+    def claim(self, request):
+        serializer = ClaimSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        jobs = claim_jobs(serializer.validated_data['runner'], serializer.validated_data['limit'])
+        return Response(ClaimedJobSerializer(jobs, many=True).data)
+
+    @extend_schema(request=LeaseSerializer, responses={204: None})
+    @action(detail=True, methods=['post'])
+    def heartbeat(self, request, pk=None):
+        serializer = LeaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not heartbeat(pk, serializer.validated_data['lease_token']):
+            return Response({'detail': 'Lease lost'}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @extend_schema(request=CompleteSerializer, responses={204: None})
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        serializer = CompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if not complete(pk, data['lease_token'], data['succeeded'], data.get('result')):
+            return Response({'detail': 'Lease lost'}, status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,21 +1,24 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 
+from base.admin import LargeTableAdminMixin
+
 from .models import OutstandingToken
 
 
-class OutstandingTokenAdmin(admin.ModelAdmin):
+class OutstandingTokenAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = (
         "jti",
         "user",
         "created_at",
         "expires_at",
     )
-    search_fields = (
-        "user__id",
+    # jti 走唯一索引、user 走外键索引，不使用 LIKE
+    exact_search_fields = (
         "jti",
+        "user",
     )
-    ordering = ("user",)
+    ordering = ("-id",)
 
     def get_queryset(self, *args, **kwargs):
         qs = super().get_queryset(*args, **kwargs)
@@ -40,4 +43,4 @@ class OutstandingTokenAdmin(admin.ModelAdmin):
         )
 
 
-# admin.site.register(OutstandingToken, OutstandingTokenAdmin)
+admin.site.register(OutstandingToken, OutstandingTokenAdmin)
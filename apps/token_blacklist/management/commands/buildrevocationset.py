@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from demo.utils import aware_utcnow, datetime_to_epoch
+
+from ...models import BlacklistedToken
+from ...revocation import REVOCATION_FILE, write_revocation_file
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the memory-mapped revocation set from the blacklisted tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=REVOCATION_FILE)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Rebuild every N seconds instead of once",
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs["path"]
+        if not path:
+            raise CommandError("Set JWT_REVOCATION_FILE or pass --path")
+
+        while True:
+            self.build(path)
+            if not kwargs["interval"]:
+                break
+            time.sleep(kwargs["interval"])
+
+    def build(self, path):
+        # 已过期的令牌无需吊销
+        entries = (
+            BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+            .values_list("token__jti", "token__expires_at")
+            .iterator()
+        )
+        count = write_revocation_file(
+            path, ((jti, datetime_to_epoch(expires_at)) for jti, expires_at in entries)
+        )
+        self.stdout.write("Wrote %d revoked tokens to %s" % (count, path))
@@ -31,3 +31,12 @@ class OutstandingToken(models.Model):
             self.jti,
         )
 
+
+class BlacklistedToken(models.Model):
+    id = models.BigAutoField(primary_key=True, serialize=False)
+    token = models.OneToOneField(OutstandingToken, on_delete=models.CASCADE)
+
+    blacklisted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blacklisted token for {self.token.user}"
@@ -0,0 +1,152 @@
+"""
+基于内存映射文件的跨进程吊销集合。
+
+文件格式: 8 字节文件头(魔数 + 记录数)，随后是按哈希排序的定长记录，
+每条记录为 16 字节 jti 哈希 + 8 字节过期时间(epoch 秒)。
+所有 worker 只读映射同一个文件并在其上二分查找；写入方重建临时文件后通过 rename 原子替换。
+"""
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+MAGIC = b"RVK1"
+HEADER = struct.Struct(">4sI")
+HASH_SIZE = 16
+RECORD = struct.Struct(">%dsQ" % HASH_SIZE)
+
+REVOCATION_FILE = getattr(settings, "JWT_REVOCATION_FILE", None)
+# 检查文件是否被替换的最小间隔(秒)
+REVOCATION_RELOAD_INTERVAL = 1.0
+
+
+def hash_jti(jti):
+    return hashlib.blake2b(str(jti).encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+def write_revocation_file(path, entries):
+    """
+    把 (jti, expires_at_epoch) 写入新文件，再原子替换 path。
+    """
+    records = sorted((hash_jti(jti), int(expires_at)) for jti, expires_at in entries)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".revocation-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(records)))
+            for record in records:
+                f.write(RECORD.pack(*record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(records)
+
+
+class _Keys:
+    """
+    让 bisect 直接在映射内存上按记录读取哈希键。
+    """
+
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        offset = HEADER.size + index * RECORD.size
+        return self.buffer[offset:offset + HASH_SIZE]
+
+
+class RevocationSet:
+    """
+    worker 线程之间共享。每次查找只使用一份 _Keys 快照；文件被替换时只替换快照的引用，
+    旧的映射在没有线程使用后由垃圾回收解除映射，不主动 close，避免正在二分查找的线程读到已关闭的映射。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._keys = None
+        self._stat = None
+        self._checked_at = float("-inf")
+
+    def _reload(self):
+        # 文件存在与否都按间隔检查，文件缺失时不会每次查找都 stat
+        now = time.monotonic()
+        if now - self._checked_at < REVOCATION_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._clear()
+            return
+        stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat_key == self._stat:
+            return
+
+        with open(self.path, "rb") as f:
+            if st.st_size < HEADER.size:
+                self._clear()
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(mapped)
+        if magic != MAGIC or HEADER.size + count * RECORD.size > len(mapped):
+            # 从未发布给其它线程，可以直接关闭
+            mapped.close()
+            self._clear()
+            return
+
+        self._keys = _Keys(mapped, count)
+        self._stat = stat_key
+
+    def _clear(self):
+        self._keys = None
+        self._stat = None
+
+    def __len__(self):
+        self._reload()
+        keys = self._keys
+        return len(keys) if keys is not None else 0
+
+    def is_revoked(self, jti, now=None):
+        self._reload()
+        keys = self._keys
+        if keys is None:
+            return False
+
+        key = hash_jti(jti)
+        index = bisect_left(keys, key)
+        if index == len(keys) or keys[index] != key:
+            return False
+
+        _, expires_at = RECORD.unpack_from(keys.buffer, HEADER.size + index * RECORD.size)
+        if now is None:
+            now = time.time()
+        return expires_at > now
+
+
+_revocation_set = None
+
+
+def get_revocation_set():
+    """
+    返回当前进程的吊销集合；未配置 JWT_REVOCATION_FILE 时返回 None。
+    """
+    global _revocation_set
+    if REVOCATION_FILE is None:
+        return None
+    if _revocation_set is None:
+        _revocation_set = RevocationSet(REVOCATION_FILE)
+    return _revocation_set
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import revocation
+from .revocation import RevocationSet, write_revocation_file
+
+
+class RevocationSetTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "revoked.bin")
+        self.future = time.time() + 3600
+
+    def reload_now(self, revocation_set):
+        # 跳过重新加载间隔
+        revocation_set._checked_at = float("-inf")
+
+    def test_lookup(self):
+        write_revocation_file(self.path, [("a", self.future), ("b", time.time() - 1)])
+        revocation_set = RevocationSet(self.path)
+        self.assertEqual(len(revocation_set), 2)
+        self.assertTrue(revocation_set.is_revoked("a"))
+        # 已过期的记录不再视为吊销
+        self.assertFalse(revocation_set.is_revoked("b"))
+        self.assertFalse(revocation_set.is_revoked("c"))
+
+    def test_old_snapshot_stays_readable_after_replace(self):
+        write_revocation_file(self.path, [("a", self.future)])
+        revocation_set = RevocationSet(self.path)
+        self.assertTrue(revocation_set.is_revoked("a"))
+        snapshot = revocation_set._keys
+
+        write_revocation_file(self.path, [("b", self.future), ("c", self.future)])
+        self.reload_now(revocation_set)
+        self.assertTrue(revocation_set.is_revoked("b"))
+        self.assertFalse(revocation_set.is_revoked("a"))
+        # 替换前取得快照的线程仍可以读取旧映射
+        self.assertEqual(snapshot[0], revocation.hash_jti("a"))
+
+    def test_missing_file_is_checked_once_per_interval(self):
+        revocation_set = RevocationSet(self.path)
+        with mock.patch.object(revocation.os, "stat", wraps=os.stat) as stat:
+            for _ in range(100):
+                self.assertFalse(revocation_set.is_revoked("a"))
+        self.assertEqual(stat.call_count, 1)
+
+        write_revocation_file(self.path, [("a", self.future)])
+        self.reload_now(revocation_set)
+        self.assertTrue(revocation_set.is_revoked("a"))